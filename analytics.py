@@ -0,0 +1,315 @@
+"""
+Materialized summary collections for the Reports view.
+
+VehicleStats, CustomerStats and SupplierStats hold per-vehicle, per-customer and
+per-supplier rental counts and payment totals. Every rental and payment write made by the
+app or by bulk_import applies its change with $inc (one bulk_write per collection), a
+supplier write moves the totals of the vehicles it changes hands, and rebuild() recomputes
+all three from Rentals, Payments and Suppliers as a periodic consistency pass. Each write
+also stamps the summary documents it changed in SummaryChanges, so a rebuild can recompute
+those written to while it ran instead of losing their increments.
+
+DailyRevenue is the rollup behind the payments chart: payment amounts and counts per day,
+keyed by revenue_day(payment_date). record_payments_revenue() is its only incremental
+writer, used for every payment insert and delete by the app and by bulk_import, and
+rebuild_daily_revenue() recomputes it with the same key, reconciling the days stamped in
+SummaryChanges while it ran like rebuild() does. A rebuild leaves a marker in RollupStatus;
+until one exists, ensure_daily_revenue() backfills the rollup, whatever increments it
+already holds.
+
+    VehicleStats   _id vehicle_id     rentals, rental_days, payments, revenue, pending
+    CustomerStats  _id customer_id    rentals, payments, paid, pending
+    SupplierStats  _id supplier_id    vehicles, rentals, payments, revenue
+    DailyRevenue   _id YYYY-MM-DD     amount, payments
+    SummaryChanges _id {summary, key}  at
+
+Revenue is the sum of Paid payments, which CustomerStats calls paid; pending amounts are
+reported separately. A vehicle's
+revenue goes to its first supplier, the one with the lowest supplier_id
+(schema.FIRST_SUPPLIER_FIELD).
+"""
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, DESCENDING, DeleteOne, ReplaceOne, UpdateOne
+
+import schema
+
+VEHICLE_STATS = "VehicleStats"
+CUSTOMER_STATS = "CustomerStats"
+SUPPLIER_STATS = "SupplierStats"
+DAILY_REVENUE = "DailyRevenue"
+ROLLUP_STATUS = "RollupStatus"  # _id rollup name, built_at of its last full rebuild
+SUMMARY_CHANGES = "SummaryChanges"
+# Allowance for clock differences between the processes stamping changes and the one rebuilding
+CHANGE_CLOCK_MARGIN = timedelta(seconds=60)
+
+_rebuild_lock = threading.Lock()  # A scheduled and a manual rebuild share the temporary collections
+_daily_revenue_lock = threading.Lock()
+
+
+def _add(totals, key, increments):
+    if key is None:
+        return
+    entry = totals.setdefault(key, {})
+    for field, amount in increments.items():
+        entry[field] = entry.get(field, 0) + amount
+
+
+def _apply(db, totals_by_summary):
+    """
+    Apply {summary collection name: {key: increments}} with one bulk_write per collection,
+    then stamp the changed documents in SummaryChanges (after the increments, so a rebuild
+    that sees the stamp also sees the increment).
+    """
+    changed = []
+    for name, totals in totals_by_summary.items():
+        if totals:
+            db[name].bulk_write([
+                UpdateOne({"_id": key}, {"$inc": increments}, upsert=True) for key, increments in totals.items()
+            ], ordered=False)
+            changed += [{"summary": name, "key": key} for key in totals]
+    if changed:
+        now = datetime.now(timezone.utc)
+        db[SUMMARY_CHANGES].bulk_write([
+            UpdateOne({"_id": change}, {"$set": {"at": now}}, upsert=True) for change in changed
+        ], ordered=False)
+
+
+def suppliers_of(db, vehicle_ids):
+    """
+    Map vehicle IDs to the supplier_id of their first supplier, in one query.
+    """
+    supplier_of = {}
+    # Descending, so the first supplier of a vehicle is assigned last and wins
+    for supplier in db["Suppliers"].find({"vehicle_id": {"$in": list(vehicle_ids)}},
+                                         {"_id": 0, "vehicle_id": 1, "supplier_id": 1}).sort(schema.FIRST_SUPPLIER_FIELD, DESCENDING):
+        supplier_of[supplier["vehicle_id"]] = supplier["supplier_id"]
+    return supplier_of
+
+
+def record_rentals(db, rentals, sign=1):
+    """
+    Count inserted rentals, or uncount deleted ones with sign=-1.
+    """
+    if not rentals:
+        return
+    supplier_of = suppliers_of(db, {rental["vehicle_id"] for rental in rentals})
+    vehicle_totals, customer_totals, supplier_totals = {}, {}, {}
+    for rental in rentals:
+        _add(vehicle_totals, rental["vehicle_id"], {"rentals": sign, "rental_days": sign * int(rental["no_of_days_rented"])})
+        _add(customer_totals, rental["customer_id"], {"rentals": sign})
+        _add(supplier_totals, supplier_of.get(rental["vehicle_id"]), {"rentals": sign})
+    _apply(db, {VEHICLE_STATS: vehicle_totals, CUSTOMER_STATS: customer_totals, SUPPLIER_STATS: supplier_totals})
+
+
+def record_payments(db, payments, sign=1):
+    """
+    Add inserted payments to the totals, or subtract deleted ones with sign=-1. A status
+    change is the old payment subtracted and the new one added.
+    """
+    if not payments:
+        return
+    vehicle_of = {rental["rental_id"]: rental["vehicle_id"] for rental in db["Rentals"].find(
+        {"rental_id": {"$in": list({payment["rental_id"] for payment in payments})}},
+        {"_id": 0, "rental_id": 1, "vehicle_id": 1})}
+    supplier_of = suppliers_of(db, set(vehicle_of.values()))
+    vehicle_totals, customer_totals, supplier_totals = {}, {}, {}
+    for payment in payments:
+        amount = sign * payment["amount"]
+        paid = payment["status"] == "Paid"
+        revenue = {"revenue": amount} if paid else {}
+        vehicle_id = vehicle_of.get(payment["rental_id"])
+        _add(customer_totals, payment["customer_id"], {"payments": sign, "paid" if paid else "pending": amount})
+        _add(vehicle_totals, vehicle_id, {"payments": sign, **(revenue if paid else {"pending": amount})})
+        _add(supplier_totals, supplier_of.get(vehicle_id), {"payments": sign, **revenue})
+    _apply(db, {VEHICLE_STATS: vehicle_totals, CUSTOMER_STATS: customer_totals, SUPPLIER_STATS: supplier_totals})
+
+
+def record_supplier_changes(db, vehicle_ids, suppliers_before):
+    """
+    Move the totals of vehicles whose first supplier changed with a supplier insert, update
+    or delete from the old supplier to the new one. suppliers_before is suppliers_of() for
+    the same vehicles, taken before the write.
+    """
+    suppliers_after = suppliers_of(db, vehicle_ids)
+    moved = [vehicle_id for vehicle_id in set(vehicle_ids) if suppliers_before.get(vehicle_id) != suppliers_after.get(vehicle_id)]
+    if not moved:
+        return
+    vehicle_stats = {row["_id"]: row for row in db[VEHICLE_STATS].find({"_id": {"$in": moved}})}
+    supplier_totals = {}
+    for vehicle_id in moved:
+        stats = vehicle_stats.get(vehicle_id, {})
+        increments = {"vehicles": 1, **{field: stats.get(field, 0) for field in ("rentals", "payments", "revenue")}}
+        _add(supplier_totals, suppliers_before.get(vehicle_id), {field: -amount for field, amount in increments.items()})
+        _add(supplier_totals, suppliers_after.get(vehicle_id), increments)
+    _apply(db, {SUPPLIER_STATS: supplier_totals})
+    # A supplier left without vehicles has nothing to report
+    db[SUPPLIER_STATS].delete_many({"_id": {"$in": list(supplier_totals)}, "vehicles": {"$lte": 0}})
+
+
+def revenue_day(payment_date):
+    """
+    The DailyRevenue key of a payment date: its YYYY-MM-DD part, dropping any time.
+    """
+    return str(payment_date)[:10]
+
+
+def record_payments_revenue(db, payments, sign=1):
+    """
+    Add inserted payments to the DailyRevenue rollup with one bulk_write, or subtract
+    deleted ones with sign=-1.
+    """
+    totals = {}
+    for payment in payments:
+        _add(totals, revenue_day(payment["payment_date"]), {"amount": sign * payment["amount"], "payments": sign})
+    _apply(db, {DAILY_REVENUE: totals})
+
+
+def _daily_revenue_pipeline(days=None):
+    # Payment dates are strings that may carry a time, so a day matches by prefix
+    match = [{"$match": {"$or": [{"payment_date": {"$regex": f"^{re.escape(day)}"}} for day in days]}}] if days else []
+    return match + [
+        {"$group": {
+            "_id": {"$substr": ["$payment_date", 0, 10]},
+            "amount": {"$sum": "$amount"},
+            "payments": {"$sum": 1},
+        }},
+    ]
+
+
+def rebuild_daily_revenue(db):
+    """
+    Recompute the DailyRevenue rollup from Payments in one server-side pass, keyed like
+    revenue_day(). The $out swap drops increments made while it ran, so the days stamped
+    since it started are then recomputed one by one.
+    """
+    with _daily_revenue_lock:
+        started = datetime.now(timezone.utc) - CHANGE_CLOCK_MARGIN
+        db["Payments"].aggregate(_daily_revenue_pipeline() + [{"$out": DAILY_REVENUE}])
+        changes = {"_id.summary": DAILY_REVENUE}
+        days = {change["_id"]["key"] for change in db[SUMMARY_CHANGES].find({**changes, "at": {"$gte": started}}, {"_id": 1})}
+        if days:
+            totals = {row["_id"]: row for row in db["Payments"].aggregate(_daily_revenue_pipeline(days))}
+            db[DAILY_REVENUE].bulk_write([
+                ReplaceOne({"_id": day}, totals[day], upsert=True) if day in totals else DeleteOne({"_id": day})
+                for day in days
+            ], ordered=False)
+        db[SUMMARY_CHANGES].delete_many({**changes, "at": {"$lt": started}})
+    db[ROLLUP_STATUS].update_one({"_id": DAILY_REVENUE}, {"$set": {"built_at": datetime.now(timezone.utc)}}, upsert=True)
+
+
+def ensure_daily_revenue(db):
+    """
+    Backfill DailyRevenue from Payments unless a rebuild has already built it. The
+    rollup's contents are not a sign that it was built: payment writes made before the
+    first backfill leave documents for their own days only.
+    """
+    if not db[ROLLUP_STATUS].find_one({"_id": DAILY_REVENUE}):
+        rebuild_daily_revenue(db)
+
+
+def _amount_if(status, prefix=""):
+    return {"$sum": {"$cond": [{"$eq": [f"${prefix}status", status]}, f"${prefix}amount", 0]}}
+
+
+def rebuild(db):
+    """
+    Recompute the summary collections server-side. Each is built under a temporary name
+    and then swapped in with $out, which replaces it atomically and keeps its indexes.
+    The swap drops increments applied to the old collections while the rebuild ran, so
+    the documents stamped in SummaryChanges since it started are then recomputed in
+    place. A write landing during that last short pass can still be off until the next
+    rebuild.
+    """
+    with _rebuild_lock:
+        started = datetime.now(timezone.utc) - CHANGE_CLOCK_MARGIN
+        _rebuild(db)
+        changes = {"_id.summary": {"$in": [VEHICLE_STATS, CUSTOMER_STATS, SUPPLIER_STATS]}}
+        changed = {}
+        for change in db[SUMMARY_CHANGES].find({**changes, "at": {"$gte": started}}, {"_id": 1}):
+            changed.setdefault(change["_id"]["summary"], set()).add(change["_id"]["key"])
+        if changed:
+            _recompute(db, changed)
+        db[SUMMARY_CHANGES].delete_many({**changes, "at": {"$lt": started}})
+
+
+def _temporary(name):
+    return f"{name}_rebuild"
+
+
+def _build_vehicles(db, into, vehicle_ids=None):
+    match = [{"$match": {"vehicle_id": {"$in": list(vehicle_ids)}}}] if vehicle_ids is not None else []
+    db["Rentals"].aggregate(match + [
+        {"$group": {"_id": "$vehicle_id", "rentals": {"$sum": 1}, "rental_days": {"$sum": "$no_of_days_rented"}}},
+        {"$out": into},
+    ])
+    db["Rentals"].aggregate(match + [
+        {"$lookup": {"from": "Payments", "localField": "rental_id", "foreignField": "rental_id", "as": "payment"}},
+        {"$unwind": "$payment"},
+        {"$group": {"_id": "$vehicle_id", "payments": {"$sum": 1}, "revenue": _amount_if("Paid", "payment."),
+                    "pending": _amount_if("Pending", "payment.")}},
+        {"$merge": {"into": into, "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ])
+
+
+def _build_customers(db, into, customer_ids=None):
+    match = [{"$match": {"customer_id": {"$in": list(customer_ids)}}}] if customer_ids is not None else []
+    db["Rentals"].aggregate(match + [
+        {"$group": {"_id": "$customer_id", "rentals": {"$sum": 1}}},
+        {"$out": into},
+    ])
+    db["Payments"].aggregate(match + [
+        {"$group": {"_id": "$customer_id", "payments": {"$sum": 1},
+                    "paid": _amount_if("Paid"), "pending": _amount_if("Pending")}},
+        {"$merge": {"into": into, "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ])
+
+
+def _build_suppliers(db, into, vehicle_stats, supplier_ids=None):
+    match = [{"$match": {"supplier_id": {"$in": list(supplier_ids)}}}] if supplier_ids is not None else []
+    db["Suppliers"].aggregate([
+        {"$sort": {schema.FIRST_SUPPLIER_FIELD: ASCENDING}},
+        {"$group": {"_id": "$vehicle_id", "supplier_id": {"$first": "$supplier_id"}}},
+        *match,
+        {"$lookup": {"from": vehicle_stats, "localField": "_id", "foreignField": "_id", "as": "stats"}},
+        {"$unwind": {"path": "$stats", "preserveNullAndEmptyArrays": True}},
+        {"$group": {"_id": "$supplier_id", "vehicles": {"$sum": 1}, "rentals": {"$sum": "$stats.rentals"},
+                    "payments": {"$sum": "$stats.payments"}, "revenue": {"$sum": "$stats.revenue"}}},
+        {"$out": into},
+    ])
+
+
+def _rebuild(db):
+    vehicle_tmp, customer_tmp, supplier_tmp = (_temporary(name) for name in (VEHICLE_STATS, CUSTOMER_STATS, SUPPLIER_STATS))
+    _build_vehicles(db, vehicle_tmp)
+    _build_customers(db, customer_tmp)
+    _build_suppliers(db, supplier_tmp, vehicle_tmp)
+
+    for tmp, name in [(vehicle_tmp, VEHICLE_STATS), (customer_tmp, CUSTOMER_STATS), (supplier_tmp, SUPPLIER_STATS)]:
+        db[tmp].aggregate([{"$out": name}])
+        db[tmp].drop()
+
+
+def _recompute(db, changed):
+    """
+    Recompute the given {summary name: keys} from the source collections and replace them
+    in the live summaries. Suppliers come last, since they read the live VehicleStats.
+    """
+    builders = [
+        (VEHICLE_STATS, lambda into, keys: _build_vehicles(db, into, keys)),
+        (CUSTOMER_STATS, lambda into, keys: _build_customers(db, into, keys)),
+        (SUPPLIER_STATS, lambda into, keys: _build_suppliers(db, into, VEHICLE_STATS, keys)),
+    ]
+    for name, build in builders:
+        keys = changed.get(name)
+        if not keys:
+            continue
+        tmp = _temporary(name)
+        build(tmp, keys)
+        db[tmp].aggregate([{"$merge": {"into": name, "whenMatched": "replace", "whenNotMatched": "insert"}}])
+        # Keys with nothing left in the sources, e.g. a vehicle whose last rental was deleted
+        rebuilt = set(db[tmp].distinct("_id"))
+        db[name].delete_many({"_id": {"$in": [key for key in keys if key not in rebuilt]}})
+        db[tmp].drop()
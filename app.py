@@ -1,16 +1,89 @@
 import streamlit as st
-from pymongo import MongoClient
+import analytics
+import booking
+import bulk_import
+import export
+import instrumentation
+import schema
+import storage
+from cache import TTLCache
+from jobs import JobRunner
+from pymongo import MongoClient, AsyncMongoClient, ASCENDING, DESCENDING, TEXT, DeleteOne, UpdateOne
+from pymongo.errors import (BulkWriteError, ConnectionFailure, OperationFailure, PyMongoError,
+                            ServerSelectionTimeoutError)
 import pandas as pd
-import matplotlib.pyplot as plt
+import pyarrow as pa
+from matplotlib.figure import Figure
 import seaborn as sns
 import plotly.express as px
-from datetime import datetime
+from PIL import Image
+from datetime import datetime, date, timedelta
+import asyncio
 import base64
-
+import hashlib
+import io
+import json
+import re
+import os
+import threading
+import time
+import itertools
+
+
+# MongoDB configuration, overridable through environment variables
+MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017/")
+MONGODB_DB = os.environ.get("MONGODB_DB", "vehicle_rental_system")
+MONGODB_MAX_POOL_SIZE = int(os.environ.get("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "1000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGODB_CONNECT_TIMEOUT_MS", "1000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGODB_SOCKET_TIMEOUT_MS", "30000"))
+REFERENCE_CACHE_TTL_SECONDS = float(os.environ.get("REFERENCE_CACHE_TTL_SECONDS", "300"))
+REFERENCE_CACHE_MAX_ENTRIES = int(os.environ.get("REFERENCE_CACHE_MAX_ENTRIES", "1024"))
+REFERENCE_CACHE_CHANGE_STREAM = os.environ.get("REFERENCE_CACHE_CHANGE_STREAM", "0") == "1"
+QUERY_PROFILER_SLOW_MS = float(os.environ.get("QUERY_PROFILER_SLOW_MS", "100"))
+QUERY_PROFILER_REPEAT_THRESHOLD = int(os.environ.get("QUERY_PROFILER_REPEAT_THRESHOLD", "3"))
+REPORT_JOB_WORKERS = int(os.environ.get("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_MAX_AGE_SECONDS = float(os.environ.get("REPORT_JOB_MAX_AGE_SECONDS", "300"))
+REPORT_JOB_MAX_RESULTS = int(os.environ.get("REPORT_JOB_MAX_RESULTS", "256"))
+REPORT_JOB_POLL_SECONDS = float(os.environ.get("REPORT_JOB_POLL_SECONDS", "1"))
+EXPORT_MAX_ROWS = int(os.environ.get("EXPORT_MAX_ROWS", "100000"))
+EXPORT_MAX_FILES = int(os.environ.get("EXPORT_MAX_FILES", "4"))
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_DIR, "static")
+
+def query_profiler_panel(records):
+    with st.sidebar.expander(f"Query Profiler ({len(records)} commands)", expanded=True):
+        for warning in instrumentation.query_profile_warnings(records, QUERY_PROFILER_SLOW_MS, QUERY_PROFILER_REPEAT_THRESHOLD):
+            st.warning(warning)
+        if records:
+            st.caption(f"{sum(record['duration_ms'] for record in records):.1f} ms in the database this rerun")
+            st.dataframe(pd.DataFrame(records)[["function", "command", "collection", "duration_ms", "documents", "shape"]], hide_index=True)
+            st.download_button("Export JSON lines", "\n".join(json.dumps(record) for record in records),
+                               file_name="query_profile.jsonl", mime="application/json")
+
+@st.cache_resource
+def get_client():
+    """
+    Create the MongoClient once per server process so every session and rerun shares its pool.
+    """
+    pool_stats = instrumentation.PoolStats(MONGODB_MAX_POOL_SIZE)
+    # Queries are attributed to functions of the app's own modules
+    query_profiler = instrumentation.QueryProfiler(
+        [__file__] + [module.__file__ for module in (analytics, bulk_import, export, storage)])
+    mongo_client = MongoClient(
+        MONGODB_URI,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+        event_listeners=[pool_stats, query_profiler],
+    )
+    return mongo_client, pool_stats, query_profiler
 
 # MongoDB connection
-client = MongoClient("mongodb://localhost:27017/")
-db = client["vehicle_rental_system"]
+client, pool_stats, query_profiler = get_client()
+db = client[MONGODB_DB]
 
 # Collections
 users = db["Users"]
@@ -19,13 +92,505 @@ vehicles = db["Vehicles"]
 rentals = db["Rentals"]
 suppliers = db["Suppliers"]
 payments = db["Payments"]
+daily_revenue = db[analytics.DAILY_REVENUE]  # Rollup of payment amounts per day, kept by analytics.py
+# Per-vehicle, per-customer and per-supplier totals maintained by analytics.py
+vehicle_stats = db[analytics.VEHICLE_STATS]
+customer_stats = db[analytics.CUSTOMER_STATS]
+supplier_stats = db[analytics.SUPPLIER_STATS]
+summary_changes = db[analytics.SUMMARY_CHANGES]  # Summary documents written to recently, for rebuilds
+# Login, registration, the customer dashboard, the pending payments report and the admin's
+# single-record forms go through the storage interface (see storage.py). The app always runs on MongoDB: the rest of it uses
+# features the interface does not model, so there is no setting to pick another backend.
+repository = storage.MongoRepository(db)
+
+# Async data access: independent queries of a page run concurrently on a background event
+# loop, so the page waits for its slowest query instead of the sum of all of them
+@st.cache_resource
+def get_async_db():
+    """
+    Start the event loop thread and create the AsyncMongoClient on it, once per server process.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="mongodb-async", daemon=True).start()
+
+    async def connect():
+        return AsyncMongoClient(
+            MONGODB_URI,
+            maxPoolSize=MONGODB_MAX_POOL_SIZE,
+            serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+            event_listeners=[pool_stats, query_profiler],
+        )
+
+    async_client = asyncio.run_coroutine_threadsafe(connect(), loop).result()
+    return loop, async_client[MONGODB_DB]
+
+async_loop, async_db = get_async_db()
+
+def run_concurrently(*queries):
+    """
+    Run coroutines on the async client concurrently and return their results in order.
+    Called from the script thread, it blocks until the slowest one finishes, e.g.
+    rows, total = run_concurrently(async_db[name].find(query).to_list(), async_db[name].count_documents(query))
+    """
+    run = query_profiler.current_run()
+
+    async def gather():
+        query_profiler.attach(run)
+        return await asyncio.gather(*queries)
+
+    return asyncio.run_coroutine_threadsafe(gather(), async_loop).result()
+
+# Indexes: unique business keys plus the foreign keys and filters we query on.
+# A list of fields declares a compound index.
+INDEXES = {
+    users: [("username", True)],
+    customers: [("customer_id", True), ("email", False), ("search_keys", False)],
+    vehicles: [("vehicle_id", True), ("search_keys", False)],
+    rentals: [("rental_id", True), ("vehicle_id", False), ("start_date", False),
+              (["customer_id", "start_date"], False),  # a customer's rentals, latest first
+              (["vehicle_id", "end_date", "start_date"], False),  # per-vehicle booking intervals
+              (["end_date", "start_date", "vehicle_id"], False)],  # fleet-wide availability windows
+    suppliers: [("supplier_id", True), ("vehicle_id", False), ("search_keys", False)],
+    payments: [("payment_id", True), ("rental_id", False), ("payment_date", False),
+               (["status", "payment_date", "payment_id"], False)],  # pending payments by date, and exports by status
+    vehicle_stats: [("revenue", False)],
+    customer_stats: [("pending", False)],
+    supplier_stats: [("revenue", False)],
+    summary_changes: [("at", False)],
+}
+
+# Text indexes for the admin search, ranked by relevance (one per collection)
+TEXT_INDEXES = {
+    customers: ["name", "email"],
+    vehicles: ["vehicle_name", "brand", "type"],
+    suppliers: ["supplier_name", "email"],
+}
+
+def has_unique_index(collection, keys):
+    return any(index.get("unique") and [key for key, _ in index["key"]] == keys
+               for index in collection.index_information().values())
+
+def duplicate_keys(collection, keys, limit=3):
+    """
+    Up to `limit` key values held by more than one document, with their counts.
+    Documents missing a key group under None, as a unique index would treat them.
+    """
+    return list(collection.aggregate([
+        {"$group": {"_id": {key: f"${key}" for key in keys}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ], allowDiskUse=True))
+
+@st.cache_resource
+def ensure_indexes():
+    """
+    Create the indexes declared in INDEXES and TEXT_INDEXES. Cached so it runs once per server process.
+    A unique index is not built while its collection holds duplicate keys, since the build
+    would fail; those and any index that fails to build are returned as problems to report.
+    """
+    problems = []
+    for collection, fields in INDEXES.items():
+        for field, unique in fields:
+            keys = [field] if isinstance(field, str) else field
+            try:
+                if unique and not has_unique_index(collection, keys):
+                    duplicates = duplicate_keys(collection, keys)
+                    if duplicates:
+                        examples = ", ".join(" / ".join(str(duplicate["_id"].get(key, "missing")) for key in keys) + f" ({duplicate['count']}×)"
+                                             for duplicate in duplicates)
+                        problems.append(f"{collection.name} has duplicate {', '.join(keys)} values, e.g. {examples}. "
+                                        "Its unique index was not created, so new duplicates are not rejected; "
+                                        "remove them and restart the app.")
+                        continue
+                collection.create_index([(key, ASCENDING) for key in keys], unique=unique)
+            except OperationFailure as e:
+                problems.append(f"The {', '.join(keys)} index on {collection.name} could not be built ({e}).")
+    for collection, fields in TEXT_INDEXES.items():
+        try:
+            collection.create_index([(field, TEXT) for field in fields])
+        except OperationFailure as e:
+            problems.append(f"The search index on {collection.name} could not be built ({e}).")
+    return problems
+
+def with_search_keys(collection, document):
+    return {**document, "search_keys": schema.search_keys(collection.name, document)}
+
+@st.cache_resource
+def ensure_search_keys():
+    """
+    Backfill search_keys on documents written before search existed, once per server process.
+    """
+    for collection in TEXT_INDEXES:
+        cursor = collection.find({"search_keys": {"$exists": False}}, {key: 1 for key in schema.SEARCH_FIELDS[collection.name]})
+        for batch in iter(lambda: list(itertools.islice(cursor, 1000)), []):
+            collection.bulk_write([
+                UpdateOne({"_id": document["_id"]}, {"$set": {"search_keys": schema.search_keys(collection.name, document)}})
+                for document in batch
+            ], ordered=False)
+    return True
+
+# Reference data cache: vehicles and suppliers change rarely but are read on every rerun
+def watch_reference_changes(cache):
+    """
+    Invalidate the cache when another process writes to Vehicles or Suppliers.
+    Change streams need a replica set; on a standalone server the watcher stops quietly.
+    """
+    namespaces = {vehicles.name: "vehicles", suppliers.name: "suppliers"}
+    pipeline = [{"$match": {"ns.coll": {"$in": list(namespaces)}}}]
+    try:
+        with db.watch(pipeline) as stream:
+            for change in stream:
+                cache.invalidate(namespaces[change["ns"]["coll"]])
+    except PyMongoError:
+        pass
+
+@st.cache_resource
+def get_reference_cache():
+    """
+    Create the reference data cache once per server process.
+    """
+    cache = TTLCache(REFERENCE_CACHE_MAX_ENTRIES, REFERENCE_CACHE_TTL_SECONDS)
+    if REFERENCE_CACHE_CHANGE_STREAM:
+        threading.Thread(target=watch_reference_changes, args=(cache,), daemon=True).start()
+    return cache
+
+reference_cache = get_reference_cache()
+
+async def cached_vehicle_async(vehicle_id):
+    return await reference_cache.get_or_load_async(
+        ("vehicles", "vehicle", vehicle_id),
+        lambda: async_db[vehicles.name].find_one({"vehicle_id": vehicle_id}, {"_id": 0}),
+    )
+
+async def cached_supplier_for_vehicle_async(vehicle_id):
+    return await reference_cache.get_or_load_async(
+        ("suppliers", "vehicle", vehicle_id),
+        lambda: async_db[suppliers.name].find_one({"vehicle_id": vehicle_id}, {"_id": 0},
+                                                  sort=[(schema.FIRST_SUPPLIER_FIELD, ASCENDING)]),
+    )
+
+# Background report jobs: heavy reports run on a thread pool once per data version, and
+# every viewer gets the stored result instead of recomputing it on its own rerun
+@st.cache_resource
+def get_job_runner():
+    """
+    Create the report job runner once per server process, shared by all sessions.
+    """
+    return JobRunner(REPORT_JOB_WORKERS, REPORT_JOB_MAX_AGE_SECONDS, REPORT_JOB_MAX_RESULTS)
+
+job_runner = get_job_runner()
+
+def background_report(key, namespaces, job, render, empty_message):
+    """
+    Render a report computed by the job runner for the current version of `namespaces`.
+    While a newer result is computing the last good one is shown and the report polls
+    for completion, then reruns the page once it is ready.
+    """
+    version = reference_cache.data_version(*namespaces)
+    _, current, error = job_runner.request(key, version, job)
+
+    @st.fragment(run_every=None if current or error else REPORT_JOB_POLL_SECONDS)
+    def show():
+        result, now_current, now_error = job_runner.request(key, version, job)
+        if (now_current or now_error) and not (current or error):
+            st.rerun()
+        if now_error:
+            st.error(f"The report could not be computed ({now_error}).")
+        if result is None:
+            if not now_error:
+                st.info("Computing the report...")
+            return
+        if not render(result["value"]):
+            st.write(empty_message)
+        if not now_current and not now_error:
+            st.caption("Showing the last computed result; an updated one is being computed.")
+
+    show()
+
+def prepare_database():
+    """
+    Run the per-process and daily setup. Every step is cached, so once it has run the
+    rerun sends no commands for it.
+    """
+    ensure_indexes()
+    ensure_search_keys()
+    ensure_daily_revenue()
+    daily_availability_sync(date.today())
+    daily_analytics_rebuild(date.today())
 
 # Authentication
 def authenticate(username, password):
-    user = users.find_one({"username": username, "password": password})
+    user = next(iter(repository.find("users", {"username": username, "password": password}, limit=1)), None)
     return user
 
 
+# Paginated table views
+# Columnar result sets: query results loaded into Arrow tables (storage.aggregate_arrow) for
+# st.dataframe and the charts
+def arrow_memory_caption(table):
+    size, unit = table.nbytes, "bytes"
+    for next_unit in ["KB", "MB"]:
+        if size < 1024:
+            break
+        size, unit = size / 1024, next_unit
+    return f"{table.num_rows} rows · {size:,.0f} {unit} in memory (Arrow)"
+
+TABLE_PAGE_SIZES = [25, 50, 100]
+TABLE_COUNT_CAP = 10000
+
+def _keyset_filter(sort_field, key_field, last, descending):
+    """
+    Build the filter for the rows after `last` = (sort value, key value) in the
+    (sort_field, key_field) ordering, so the next page starts right after the previous one.
+    """
+    last_value, last_key = last
+    after = "$lt" if descending else "$gt"
+    if sort_field == key_field:
+        return {key_field: {after: last_key}}
+    if last_value is None:
+        # Missing values sort first ascending and last descending
+        same_value = {sort_field: None, key_field: {after: last_key}}
+        return same_value if descending else {"$or": [{sort_field: {"$ne": None}}, same_value]}
+    conditions = [
+        {sort_field: {after: last_value}},
+        {sort_field: last_value, key_field: {after: last_key}},
+    ]
+    if descending:
+        # $lt does not match null or missing values, which come after every value descending
+        conditions.append({sort_field: None})
+    return {"$or": conditions}
+
+def paginated_table(collection, key_field, columns, table_key, cache_namespace=None, batch_actions=None):
+    """
+    Display one page of a collection using keyset pagination on its indexed business key.
+    Only the visible page and the displayed columns are fetched. Pages of reference data
+    are served from the reference cache when a cache_namespace is given.
+    batch_actions maps button labels to functions taking the selected keys and returning
+    a bulk_write summary; with it, rows of the page can be selected.
+    """
+    col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
+    sort_field = col1.selectbox("Sort By", columns, key=f"{table_key}_sort")
+    filter_text = col2.text_input(f"Filter by {key_field} (prefix)", key=f"{table_key}_filter")
+    descending = col3.selectbox("Order", ["Asc", "Desc"], key=f"{table_key}_order") == "Desc"
+    page_size = col4.selectbox("Page Size", TABLE_PAGE_SIZES, key=f"{table_key}_page_size")
+
+    # Cursor stack: the last (sort value, key) of every page before the current one.
+    # Changing the sort, filter or page size starts again from the first page.
+    state_key = f"{table_key}_cursors"
+    # Bumped whenever the visible rows change, so the grid starts with a fresh selection
+    selection_key = f"{table_key}_selection_generation"
+    view = (sort_field, filter_text, descending, page_size)
+    if st.session_state.get(f"{table_key}_view") != view:
+        st.session_state[f"{table_key}_view"] = view
+        st.session_state[state_key] = []
+        st.session_state[selection_key] = st.session_state.get(selection_key, 0) + 1
+    cursors = st.session_state[state_key]
+
+    base_filter = {key_field: {"$regex": f"^{re.escape(filter_text)}"}} if filter_text else {}
+    query = dict(base_filter)
+    if cursors:
+        query = {"$and": [base_filter, _keyset_filter(sort_field, key_field, cursors[-1], descending)]}
+
+    direction = DESCENDING if descending else ASCENDING
+    sort = [(sort_field, direction)] if sort_field == key_field else [(sort_field, direction), (key_field, direction)]
+    projection = {"_id": 0, **{column: 1 for column in columns}}
+
+    def load_page():
+        # The page and its approximate total are fetched concurrently. The total comes from
+        # collection metadata when unfiltered and from a capped count otherwise.
+        async_collection = async_db[collection.name]
+        if base_filter:
+            count = async_collection.count_documents(base_filter, limit=TABLE_COUNT_CAP)
+        else:
+            count = async_collection.estimated_document_count()
+        page_rows, total = run_concurrently(
+            async_collection.find(query, projection).sort(sort).limit(page_size + 1).to_list(), count)
+        if base_filter:
+            page_total = f"{total}+" if total >= TABLE_COUNT_CAP else str(total)
+        else:
+            page_total = f"~{total}"
+        return page_rows, page_total
+
+    if cache_namespace:
+        rows, total_label = reference_cache.get_or_load((cache_namespace, "page", repr((query, sort, projection, page_size))), load_page)
+    else:
+        rows, total_label = load_page()
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    def new_selection():
+        st.session_state[selection_key] = st.session_state.get(selection_key, 0) + 1
+
+    selected = []
+    if rows and batch_actions:
+        event = st.dataframe(rows, column_order=columns, hide_index=True, on_select="rerun", selection_mode="multi-row",
+                             key=f"{table_key}_grid_{st.session_state.get(selection_key, 0)}")
+        selected = [rows[index][key_field] for index in event.selection.rows]
+    elif rows:
+        st.dataframe(rows, column_order=columns, hide_index=True)
+    else:
+        st.write("No records found.")
+
+    if batch_actions:
+        def apply(action, keys):
+            st.session_state[f"{table_key}_batch_result"] = action(keys)
+            new_selection()
+
+        buttons = st.columns(len(batch_actions) + 1)
+        buttons[0].write(f"{len(selected)} selected")
+        for button, (label, action) in zip(buttons[1:], batch_actions.items()):
+            button.button(label, key=f"{table_key}_batch_{label}", disabled=not selected, on_click=apply, args=(action, selected))
+        if result := st.session_state.pop(f"{table_key}_batch_result", None):
+            message = f"Matched {result['matched']}, modified {result['modified']}, deleted {result['deleted']}, failed {result['failed']}."
+            (st.warning if result["failed"] else st.success)(message)
+
+    def previous_page():
+        cursors.pop()
+        new_selection()
+
+    def next_page():
+        last = rows[-1]
+        cursors.append((last.get(sort_field), last.get(key_field)))
+        new_selection()
+
+    nav1, nav2, nav3 = st.columns([1, 1, 4])
+    nav1.button("Previous", key=f"{table_key}_prev", disabled=not cursors, on_click=previous_page)
+    nav2.button("Next", key=f"{table_key}_next", disabled=not has_next, on_click=next_page)
+    nav3.write(f"Page {len(cursors) + 1} · {total_label} records")
+
+# Admin search: relevance-ranked text matches, then case-insensitive prefix matches
+SEARCH_LIMIT = 20
+SEARCH_MIN_CHARS = 2
+
+def search_records(collection, key_field, columns, text, limit=SEARCH_LIMIT):
+    """
+    Return at most limit documents matching text, and whether full-text matching was
+    available. Full-text matches (whole words, stemmed) come first by relevance, followed
+    by documents where every word of text prefixes one of their search_keys. Both queries
+    use indexes and run concurrently. Without a text index (ensure_indexes reports when it
+    could not be built) only the prefix matches are returned.
+    """
+    terms = [term for term in re.split(r"[\W_]+", text.lower()) if term]
+    if not terms:
+        return [], True
+    projection = {"_id": 0, **{column: 1 for column in columns}}
+    async_collection = async_db[collection.name]
+
+    async def text_matches():
+        try:
+            return await (async_collection.find({"$text": {"$search": text}}, {**projection, "score": {"$meta": "textScore"}})
+                          .sort([("score", {"$meta": "textScore"})]).limit(limit).to_list())
+        except OperationFailure:
+            return None
+
+    ranked, prefixed = run_concurrently(
+        text_matches(),
+        async_collection.find({"$and": [{"search_keys": {"$regex": f"^{re.escape(term)}"}} for term in terms]}, projection)
+        .limit(limit).to_list(),
+    )
+    results, seen = [], set()
+    for document in (ranked or []) + prefixed:
+        if document[key_field] not in seen:
+            seen.add(document[key_field])
+            document.pop("score", None)
+            results.append(document)
+    return results[:limit], ranked is not None
+
+def search_box(collection, key_field, columns, table_key, label):
+    # Text inputs only rerun on Enter or when focus leaves them, so typing alone sends no queries
+    text = st.text_input(label, key=f"{table_key}_search").strip()
+    if len(text) >= SEARCH_MIN_CHARS:
+        results, full_text = search_records(collection, key_field, columns, text)
+        if not full_text:
+            st.caption("Full-text search is unavailable on this collection; showing prefix matches only.")
+        if results:
+            st.dataframe(results, column_order=columns, hide_index=True)
+        else:
+            st.write("No matches found.")
+    elif text:
+        st.caption(f"Type at least {SEARCH_MIN_CHARS} characters to search.")
+
+# Batch actions on the rows selected in the admin tables, one unordered bulk_write each
+def bulk_write_summary(collection, operations):
+    """
+    Apply the operations with a single bulk_write and count matched, modified, deleted and failed writes.
+    """
+    try:
+        result = collection.bulk_write(operations, ordered=False).bulk_api_result
+    except BulkWriteError as e:
+        result = e.details
+    return {
+        "matched": result["nMatched"],
+        "modified": result["nModified"],
+        "deleted": result["nRemoved"],
+        "failed": len(result["writeErrors"]),
+    }
+
+def delete_selected(collection, key_field, cache_namespace=None):
+    def delete(keys):
+        summary = bulk_write_summary(collection, [DeleteOne({key_field: key}) for key in keys])
+        if cache_namespace:
+            reference_cache.invalidate(cache_namespace)
+        return summary
+    return delete
+
+def set_selected_vehicles_service(out_of_service):
+    def update(keys):
+        summary = bulk_write_summary(vehicles, [
+            UpdateOne({"vehicle_id": key}, {"$set": {"out_of_service": out_of_service}}) for key in keys
+        ])
+        reference_cache.invalidate("vehicles")
+        sync_availability_status(keys)
+        return summary
+    return update
+
+def delete_selected_rentals(keys):
+    deleting = list(rentals.find({"rental_id": {"$in": keys}}, {"_id": 0}))
+    summary = bulk_write_summary(rentals, [DeleteOne({"rental_id": key}) for key in keys])
+    analytics.record_rentals(db, deleting, sign=-1)
+    reference_cache.invalidate("rentals")
+    sync_availability_status({rental["vehicle_id"] for rental in deleting})
+    return summary
+
+def delete_selected_suppliers(keys):
+    vehicle_ids = suppliers.distinct("vehicle_id", {"supplier_id": {"$in": keys}})
+    suppliers_before = analytics.suppliers_of(db, vehicle_ids)
+    summary = bulk_write_summary(suppliers, [DeleteOne({"supplier_id": key}) for key in keys])
+    analytics.record_supplier_changes(db, vehicle_ids, suppliers_before)
+    reference_cache.invalidate("suppliers")
+    return summary
+
+def set_selected_payments_status(status):
+    def update(keys):
+        changing = list(payments.find({"payment_id": {"$in": keys}, "status": {"$ne": status}}, {"_id": 0}))
+        summary = bulk_write_summary(payments, [
+            UpdateOne({"payment_id": key}, {"$set": {"status": status}}) for key in keys
+        ])
+        analytics.record_payments(db, changing, sign=-1)
+        analytics.record_payments(db, [{**payment, "status": status} for payment in changing])
+        reference_cache.invalidate("payments")
+        return summary
+    return update
+
+def delete_selected_payments(keys):
+    # One find_one_and_delete per payment, run concurrently, so only the payments this call
+    # removed are subtracted from the rollups, not those another session deleted meanwhile
+    deleted = [payment for payment in run_concurrently(*(
+        async_db[payments.name].find_one_and_delete({"payment_id": key}, {"_id": 0}) for key in keys
+    )) if payment]
+    analytics.record_payments_revenue(db, deleted, sign=-1)
+    analytics.record_payments(db, deleted, sign=-1)
+    reference_cache.invalidate("payments")
+    return {"matched": 0, "modified": 0, "deleted": len(deleted), "failed": 0}
+
+# Admin: single-record forms. Inserts, lookups, updates and deletes by key go through the
+# repository; the batch actions, the booking lease and the status change, which needs the
+# previous document atomically for the summaries, use the collections directly.
+def first_customer_with_email(email):
+    return next(iter(repository.find("customers", {"email": email}, limit=1)), None)
+
 # Admin: Manage Customers
 def manage_customers():
     #add customer
@@ -41,24 +606,27 @@ def manage_customers():
         # Validation to ensure no empty fields
         if not customer_id or not name or not email or not phone:
             st.error("All fields are required. Please fill out all fields before submitting.")
-        elif customers.find_one({"customer_id": customer_id}):
-            st.error("A customer with this ID already exists.")
         else:
-            # Insert into MongoDB
-            customers.insert_one({
-                "customer_id": customer_id,
-                "name": name,
-                "email": email,
-                "phone": phone
-            })
-            st.success("Customer added successfully!")
+            # The unique index on customer_id rejects duplicates
+            try:
+                repository.insert("customers", with_search_keys(customers, {
+                    "customer_id": customer_id,
+                    "name": name,
+                    "email": email,
+                    "phone": phone
+                }))
+                reference_cache.invalidate("customers")
+                st.success("Customer added successfully!")
+            except storage.DuplicateKeyError:
+                st.error("A customer with this ID already exists.")
 
     # Delete Customer
     st.write("### Delete Customer")
     cust_email_to_delete = st.text_input("Customer Email to Delete")
     if st.button("Delete Customer"):
-        result = customers.delete_one({"email": cust_email_to_delete})
-        if result.deleted_count > 0:
+        customer = first_customer_with_email(cust_email_to_delete)
+        if customer and repository.delete("customers", customer["customer_id"]):
+            reference_cache.invalidate("customers")
             st.success("Customer deleted successfully!")
         else:
             st.error("Customer not found.")
@@ -68,7 +636,7 @@ def manage_customers():
     
     if cust_email_to_update:
         # Fetch customer by email to pre-fill fields for editing
-        customer_to_update = customers.find_one({"email": cust_email_to_update})
+        customer_to_update = first_customer_with_email(cust_email_to_update)
         
         if customer_to_update:
             # Pre-fill the input fields with current customer data
@@ -77,7 +645,7 @@ def manage_customers():
             new_phone = st.text_input("New Phone Number", value=customer_to_update["phone"])
 
             if st.button("Update Customer"):
-                # Update the customer in MongoDB
+                # Update the customer
                 updated_data = {}
                 if new_name != customer_to_update["name"]:
                     updated_data["name"] = new_name
@@ -87,7 +655,9 @@ def manage_customers():
                     updated_data["phone"] = new_phone
 
                 if updated_data:
-                    customers.update_one({"email": cust_email_to_update}, {"$set": updated_data})
+                    updated_data["search_keys"] = schema.search_keys(customers.name, {**customer_to_update, **updated_data})
+                    repository.update("customers", customer_to_update["customer_id"], updated_data)
+                    reference_cache.invalidate("customers")
                     st.success("Customer information updated successfully!")
                 else:
                     st.warning("No changes were made.")
@@ -95,11 +665,10 @@ def manage_customers():
             st.error("Customer not found.")
     # View Customers in Table Format
     st.write("### All Customers")
-    customers_data = list(customers.find({}, {"_id": 0}))  # Fetch data without the MongoDB ID field
-    if customers_data:
-        st.table(customers_data)  # Display data in table format
-    else:
-        st.write("No customers found.")
+    search_box(customers, "customer_id", ["customer_id", "name", "email", "phone"], "customers_table",
+               "Search customers by name, email or phone")
+    paginated_table(customers, "customer_id", ["customer_id", "name", "email", "phone"], "customers_table",
+                    batch_actions={"Delete Selected": delete_selected(customers, "customer_id", "customers")})
 
 # Admin: Manage Vehicles
 def manage_vehicles():
@@ -111,31 +680,31 @@ def manage_vehicles():
     vehicle_name = st.text_input("Vehicle Name")
     vehicle_type = st.text_input("Vehicle Type (e.g., car, truck)")
     vehicle_brand = st.text_input("Brand")
-    availability_status = st.selectbox("Availability Status", ["Available", "Unavailable"])
     if st.button("Add Vehicle"):
-        if vehicles.find_one({"vehicle_id": vehicle_id}):
-            st.error("A vehicle with this ID already exists.")
-        else:
-            vehicles.insert_one({
+        try:
+            repository.insert("vehicles", with_search_keys(vehicles, {
                 "vehicle_id": vehicle_id,
                 "vehicle_name": vehicle_name,
                 "type": vehicle_type,
                 "brand": vehicle_brand,
-                "availability_status": availability_status
-            })
+                "availability_status": "Available"  # A new vehicle has no bookings yet
+            }))
+            reference_cache.invalidate("vehicles")
             st.success("Vehicle added successfully!")
+        except storage.DuplicateKeyError:
+            st.error("A vehicle with this ID already exists.")
 
-    # Update Vehicle Availability
-    st.write("### Update Vehicle Availability")
-    update_vehicle_id = st.text_input("Enter Vehicle ID to Update Availability")
-    new_status = st.selectbox("New Availability Status", ["Available", "Unavailable"])
-    if st.button("Update Vehicle Availability"):
-        result = vehicles.update_one(
-            {"vehicle_id": update_vehicle_id},
-            {"$set": {"availability_status": new_status}}
-        )
-        if result.matched_count > 0:
-            st.success("Vehicle availability updated successfully!")
+    # Take a vehicle out of service or return it
+    st.write("### Update Vehicle Service Status")
+    st.caption("Availability is derived from bookings and the service status. A vehicle out of "
+               "service is Unavailable and cannot be booked until it is returned to service.")
+    update_vehicle_id = st.text_input("Enter Vehicle ID to Update Service Status")
+    new_service_status = st.selectbox("New Service Status", ["In Service", "Out of Service"])
+    if st.button("Update Service Status"):
+        if repository.update("vehicles", update_vehicle_id, {"out_of_service": new_service_status == "Out of Service"}):
+            reference_cache.invalidate("vehicles")
+            sync_availability_status([update_vehicle_id])
+            st.success("Vehicle service status updated successfully!")
         else:
             st.error("Vehicle not found.")
 
@@ -143,18 +712,132 @@ def manage_vehicles():
     st.write("### Delete Vehicle")
     vehicle_id_to_delete = st.text_input("Vehicle ID to Delete")
     if st.button("Delete Vehicle"):
-        result = vehicles.delete_one({"vehicle_id": vehicle_id_to_delete})
-        if result.deleted_count > 0:
+        if repository.delete("vehicles", vehicle_id_to_delete):
+            reference_cache.invalidate("vehicles")
             st.success("Vehicle deleted successfully!")
         else:
             st.error("Vehicle not found.")
+    # Find vehicles free for a date window
+    st.write("### Find Available Vehicles")
+    window = st.date_input("Rental Window", value=[date.today(), date.today() + timedelta(days=1)], key="availability_window")
+    if len(window) == 2 and window[1] > window[0]:
+        available, total_available = find_available_vehicles(window[0], window[1])
+        st.write(f"{total_available} vehicles are free from {window[0]} until {window[1]}.")
+        if available:
+            st.dataframe(available, hide_index=True)
+    else:
+        st.info("Select a start date and a later end date.")
+
     #view tables
     st.write("### All Vehicles")
-    vehicles_data = list(vehicles.find({}, {"_id": 0}))  # Exclude MongoDB ID from the output
-    if vehicles_data:
-        st.table(vehicles_data)  # Display vehicles in table format
+    vehicle_columns = ["vehicle_id", "vehicle_name", "type", "brand", "availability_status", "out_of_service"]
+    search_box(vehicles, "vehicle_id", vehicle_columns, "vehicles_table", "Search vehicles by ID, name or brand")
+    paginated_table(vehicles, "vehicle_id", vehicle_columns, "vehicles_table", cache_namespace="vehicles",
+                    batch_actions={
+                        "Take Out of Service": set_selected_vehicles_service(True),
+                        "Return to Service": set_selected_vehicles_service(False),
+                        "Delete Selected": delete_selected(vehicles, "vehicle_id", "vehicles"),
+                    })
+
+# Bookings and availability. A rental books its vehicle from start_date (inclusive) to
+# end_date (exclusive), stored as YYYY-MM-DD strings so they compare in date order.
+def booking_end_date(start_date, no_of_days_rented):
+    return start_date + timedelta(days=int(no_of_days_rented))
+
+def overlap_filter(start_date, end_date):
+    return {"end_date": {"$gt": str(start_date)}, "start_date": {"$lt": str(end_date)}}
+
+def find_conflicting_booking(vehicle_id, start_date, end_date, exclude_rental_id=None):
+    """
+    Return a rental of the vehicle overlapping [start_date, end_date), if any.
+    Served by the (vehicle_id, end_date, start_date) index.
+    """
+    query = {"vehicle_id": vehicle_id, **overlap_filter(start_date, end_date)}
+    if exclude_rental_id:
+        query["rental_id"] = {"$ne": exclude_rental_id}
+    return rentals.find_one(query, {"_id": 0, "rental_id": 1, "start_date": 1, "end_date": 1})
+
+def book_vehicle(vehicle_id, start_date, end_date, write, exclude_rental_id=None):
+    """
+    Check for overlapping bookings and run write() (the rental insert or update) while
+    holding the vehicle's booking lock, so concurrent bookings of one vehicle are
+    serialised. Releasing the lock also marks the vehicle Unavailable when the new booking
+    covers today. Returns an error message, or None once booked; exceptions from write()
+    propagate after the lock is released.
+    """
+    token, reason = booking.claim_vehicle(db, vehicle_id)
+    if not token:
+        if reason == "missing":
+            return "Vehicle ID does not exist. Please add the vehicle first."
+        if reason == "out of service":
+            return "The vehicle is out of service. Return it to service before booking it."
+        return "The vehicle is being booked by another admin. Please try again."
+
+    unavailable = set()
+    try:
+        conflict = find_conflicting_booking(vehicle_id, start_date, end_date, exclude_rental_id)
+        if conflict:
+            return f"Vehicle is already booked from {conflict['start_date']} to {conflict['end_date']} (Rental ID '{conflict['rental_id']}')."
+        write()
+        if str(start_date) <= str(date.today()) < str(end_date):
+            unavailable.add(vehicle_id)
+        return None
+    finally:
+        booking.release_vehicles(db, [vehicle_id], token, unavailable)
+        if unavailable:
+            reference_cache.invalidate("vehicles")
+
+def booked_vehicle_ids(start_date, end_date, vehicle_ids=None):
+    """
+    Vehicle IDs with a booking overlapping [start_date, end_date).
+    """
+    query = overlap_filter(start_date, end_date)
+    if vehicle_ids is not None:
+        query["vehicle_id"] = {"$in": list(vehicle_ids)}
+    return rentals.distinct("vehicle_id", query)
+
+def find_available_vehicles(start_date, end_date, limit=100):
+    """
+    Vehicles in service with no booking overlapping [start_date, end_date), with the total number free.
+    """
+    query = {"vehicle_id": {"$nin": booked_vehicle_ids(start_date, end_date)}, "out_of_service": {"$ne": True}}
+    return run_concurrently(
+        async_db[vehicles.name].find(query, {"_id": 0}).sort("vehicle_id", ASCENDING).limit(limit).to_list(),
+        async_db[vehicles.name].count_documents(query),
+    )
+
+def sync_availability_status(vehicle_ids=None):
+    """
+    Derive availability_status from the bookings and the service status: a vehicle is
+    Unavailable while a booking covers today or while it is out of service. Only the given
+    vehicles are refreshed, or the whole fleet if none are given.
+    """
+    today = date.today()
+    busy = booked_vehicle_ids(today, today + timedelta(days=1), vehicle_ids)
+    unavailable = {"$or": [{"vehicle_id": {"$in": busy}}, {"out_of_service": True}]}
+    if vehicle_ids is None:
+        free = {"vehicle_id": {"$nin": busy}}
     else:
-        st.write("No vehicles found.")
+        unavailable["vehicle_id"] = {"$in": list(vehicle_ids)}
+        free = {"vehicle_id": {"$in": [vehicle_id for vehicle_id in vehicle_ids if vehicle_id not in busy]}}
+    modified = vehicles.update_many(
+        {**unavailable, "availability_status": {"$ne": "Unavailable"}},
+        {"$set": {"availability_status": "Unavailable"}},
+    ).modified_count
+    modified += vehicles.update_many(
+        {**free, "out_of_service": {"$ne": True}, "availability_status": {"$ne": "Available"}},
+        {"$set": {"availability_status": "Available"}},
+    ).modified_count
+    if modified:
+        reference_cache.invalidate("vehicles")
+
+@st.cache_resource
+def daily_availability_sync(day):
+    """
+    Refresh the whole fleet's status once per day per server process, as bookings start and end.
+    """
+    sync_availability_status()
+    return day
 
 # Admin: Manage Rentals
 def manage_rentals():
@@ -162,49 +845,56 @@ def manage_rentals():
     rental_id = st.text_input("Rental ID")
     customer_id = st.text_input("Customer ID")
     vehicle_id = st.text_input("Vehicle ID")
+    start_date = st.date_input("Start Date", key="rental_start_date")
     no_of_days_rented = st.number_input("Number of Days Rented", min_value=1, step=1)
+    end_date = booking_end_date(start_date, no_of_days_rented)
 
     if st.button("Add Rental"):
         if not rental_id or not customer_id or not vehicle_id:
             st.error("All fields are required.")
-        if not customers.find_one({"customer_id": customer_id}):
+        elif not repository.get("customers", customer_id):
             st.error("Customer ID does not exist. Please add the customer first.")
-        elif not vehicles.find_one({"vehicle_id": vehicle_id}):
-            st.error("Vehicle ID does not exist. Please add the vehicle first.")
         else:
             rental_data = {
                 "rental_id": rental_id,
                 "customer_id": customer_id,
                 "vehicle_id": vehicle_id,
-                "no_of_days_rented": no_of_days_rented
+                "no_of_days_rented": no_of_days_rented,
+                "start_date": str(start_date),
+                "end_date": str(end_date)
             }
-            rentals.insert_one(rental_data)
-            st.success("Rental information added successfully!")
+            try:
+                error = book_vehicle(vehicle_id, start_date, end_date, lambda: repository.insert("rentals", rental_data))
+                if error:
+                    st.error(error)
+                else:
+                    analytics.record_rentals(db, [rental_data])
+                    reference_cache.invalidate("rentals")
+                    st.success("Rental information added successfully!")
+            except storage.DuplicateKeyError:
+                st.error("A rental with this ID already exists.")
     # View Rental Information
     st.subheader("View Rental Information")
-    rentals_ = list(rentals.find())
-    if rentals_:
-        # Convert MongoDB records to a pandas DataFrame for better visualization
-        rental_df = pd.DataFrame(rentals_)
-        rental_df["_id"] = rental_df["_id"].astype(str)  # Convert ObjectId to string for display
-        st.dataframe(rental_df)
-    else:
-        st.info("No rental records found.")
+    paginated_table(rentals, "rental_id", ["rental_id", "customer_id", "vehicle_id", "start_date", "end_date", "no_of_days_rented"], "rentals_table",
+                    batch_actions={"Delete Selected": delete_selected_rentals})
     # Update Rental Information
     st.subheader("Update Rental Information")
     rental_id_to_update = st.text_input("Enter Rental ID to Update")
     
     if rental_id_to_update:
-        rental = rentals.find_one({"rental_id": rental_id_to_update})
+        rental = repository.get("rentals", rental_id_to_update)
         
         if rental:
             # Pre-fill the rental details in input fields for update
             new_customer_id = st.text_input("New Customer ID", value=rental["customer_id"])
             new_vehicle_id = st.text_input("New Vehicle ID", value=rental["vehicle_id"])
+            current_start_date = datetime.strptime(rental["start_date"], "%Y-%m-%d").date() if rental.get("start_date") else date.today()
+            new_start_date = st.date_input("New Start Date", value=current_start_date)
             new_no_of_days_rented = st.number_input("New Number of Days Rented", min_value=1, value=rental["no_of_days_rented"], step=1)
+            new_end_date = booking_end_date(new_start_date, new_no_of_days_rented)
 
             if st.button("Update Rental"):
-                # Update rental information in MongoDB
+                # Update rental information
                 updated_data = {}
                 if new_customer_id != rental["customer_id"]:
                     updated_data["customer_id"] = new_customer_id
@@ -212,12 +902,30 @@ def manage_rentals():
                     updated_data["vehicle_id"] = new_vehicle_id
                 if new_no_of_days_rented != rental["no_of_days_rented"]:
                     updated_data["no_of_days_rented"] = new_no_of_days_rented
+                if str(new_start_date) != rental.get("start_date") or str(new_end_date) != rental.get("end_date"):
+                    updated_data["start_date"] = str(new_start_date)
+                    updated_data["end_date"] = str(new_end_date)
 
-                if updated_data:
-                    rentals.update_one({"rental_id": rental_id_to_update}, {"$set": updated_data})
-                    st.success("Rental information updated successfully!")
-                else:
+                # Payments follow their rental to its new vehicle in the summaries
+                moved_payments = list(payments.find({"rental_id": rental_id_to_update}, {"_id": 0})) if "vehicle_id" in updated_data else []
+
+                def update_rental():
+                    analytics.record_payments(db, moved_payments, sign=-1)
+                    repository.update("rentals", rental_id_to_update, updated_data)
+                    analytics.record_payments(db, moved_payments)
+
+                if not updated_data:
                     st.warning("No changes were made to the rental information.")
+                elif error := book_vehicle(new_vehicle_id, new_start_date, new_end_date, update_rental,
+                                           exclude_rental_id=rental_id_to_update):
+                    st.error(error)
+                else:
+                    analytics.record_rentals(db, [rental], sign=-1)
+                    analytics.record_rentals(db, [{**rental, **updated_data}])
+                    reference_cache.invalidate("rentals")
+                    # The booking may have moved off the old vehicle or off today
+                    sync_availability_status({rental["vehicle_id"], new_vehicle_id})
+                    st.success("Rental information updated successfully!")
         else:
             st.error(f"No rental found with ID '{rental_id_to_update}'.")
     # Delete Rental Information
@@ -227,8 +935,11 @@ def manage_rentals():
         if not delete_rental_id:
             st.error("Rental ID is required.")
         else:
-            result = rentals.delete_one({"rental_id": delete_rental_id})
-            if result.deleted_count > 0:
+            deleted = repository.delete("rentals", delete_rental_id)
+            if deleted:
+                analytics.record_rentals(db, [deleted], sign=-1)
+                reference_cache.invalidate("rentals")
+                sync_availability_status([deleted["vehicle_id"]])
                 st.success(f"Rental with ID '{delete_rental_id}' deleted successfully!")
             else:
                 st.error(f"No rental found with ID '{delete_rental_id}'.")
@@ -249,32 +960,35 @@ def manage_suppliers():
         # Validate input fields
         if not supplier_id or not supplier_name or not contact_info or not email or not vehicle_id:
             st.error("All fields are required.")
-        elif suppliers.find_one({"supplier_id": supplier_id}):
-            st.error("A supplier with this ID already exists.")
         else:
-            # Insert into MongoDB
-            suppliers.insert_one({
-                "supplier_id": supplier_id,
-                "supplier_name": supplier_name,
-                "contact_info": contact_info,
-                "email": email,
-                "vehicle_id": vehicle_id
-            })
-            st.success("Supplier added successfully!")
+            # The unique index on supplier_id rejects duplicates
+            try:
+                suppliers_before = analytics.suppliers_of(db, [vehicle_id])
+                repository.insert("suppliers", with_search_keys(suppliers, {
+                    "supplier_id": supplier_id,
+                    "supplier_name": supplier_name,
+                    "contact_info": contact_info,
+                    "email": email,
+                    "vehicle_id": vehicle_id
+                }))
+                analytics.record_supplier_changes(db, [vehicle_id], suppliers_before)
+                reference_cache.invalidate("suppliers")
+                st.success("Supplier added successfully!")
+            except storage.DuplicateKeyError:
+                st.error("A supplier with this ID already exists.")
 
     # View Suppliers
     st.write("### All Suppliers")
-    suppliers_data = list(suppliers.find({}, {"_id": 0}))  # Exclude MongoDB ID from the output
-    if suppliers_data:
-        st.table(suppliers_data)  # Display suppliers in table format
-    else:
-        st.write("No suppliers found.")
+    search_box(suppliers, "supplier_id", ["supplier_id", "supplier_name", "contact_info", "email", "vehicle_id"], "suppliers_table",
+               "Search suppliers by name, email or contact")
+    paginated_table(suppliers, "supplier_id", ["supplier_id", "supplier_name", "contact_info", "email", "vehicle_id"], "suppliers_table", cache_namespace="suppliers",
+                    batch_actions={"Delete Selected": delete_selected_suppliers})
     #update
     st.write("### Update Supplier Information")
     supplier_id_to_update = st.text_input("Enter Supplier ID to Update")
     
     if supplier_id_to_update:
-        supplier = suppliers.find_one({"supplier_id": supplier_id_to_update})
+        supplier = repository.get("suppliers", supplier_id_to_update)
         
         if supplier:
             # Pre-fill the supplier details in input fields for update
@@ -284,7 +998,7 @@ def manage_suppliers():
             new_vehicle_id = st.text_input("New Vehicle ID Provided by Supplier", value=supplier["vehicle_id"])
 
             if st.button("Update Supplier"):
-                # Update supplier information in MongoDB
+                # Update supplier information
                 updated_data = {}
                 if new_supplier_name != supplier["supplier_name"]:
                     updated_data["supplier_name"] = new_supplier_name
@@ -296,7 +1010,12 @@ def manage_suppliers():
                     updated_data["vehicle_id"] = new_vehicle_id
 
                 if updated_data:
-                    suppliers.update_one({"supplier_id": supplier_id_to_update}, {"$set": updated_data})
+                    updated_data["search_keys"] = schema.search_keys(suppliers.name, {**supplier, **updated_data})
+                    affected_vehicles = [supplier["vehicle_id"], new_vehicle_id]
+                    suppliers_before = analytics.suppliers_of(db, affected_vehicles)
+                    repository.update("suppliers", supplier_id_to_update, updated_data)
+                    analytics.record_supplier_changes(db, affected_vehicles, suppliers_before)
+                    reference_cache.invalidate("suppliers")
                     st.success("Supplier information updated successfully!")
                 else:
                     st.warning("No changes were made to the supplier information.")
@@ -306,8 +1025,11 @@ def manage_suppliers():
     st.write("### Delete Supplier")
     supplier_id_to_delete = st.text_input("Supplier ID to Delete")
     if st.button("Delete Supplier"):
-        result = suppliers.delete_one({"supplier_id": supplier_id_to_delete})
-        if result.deleted_count > 0:
+        supplier = repository.get("suppliers", supplier_id_to_delete)
+        suppliers_before = analytics.suppliers_of(db, [supplier["vehicle_id"]]) if supplier else {}
+        if supplier and repository.delete("suppliers", supplier_id_to_delete):
+            analytics.record_supplier_changes(db, [supplier["vehicle_id"]], suppliers_before)
+            reference_cache.invalidate("suppliers")
             st.success("Supplier deleted successfully!")
         else:
             st.error("Supplier not found.")
@@ -327,31 +1049,37 @@ def manage_payments():
     status = st.selectbox("Payment Status", ["Paid", "Pending"])
 
     if st.button("Add Payment"):
-        if payments.find_one({"payment_id": payment_id}):
-            st.error("A payment with this ID already exists.")
-        if not customers.find_one({"customer_id": customer_id}):
+        if not repository.get("customers", customer_id):
             st.error("Customer ID does not exist. Please add the customer first.")
-        elif not rentals.find_one({"rental_id": rental_id}):
+        elif not repository.get("rentals", rental_id):
             st.error("Rental ID does not exist. Please add the rental first.")
         else:
-            payments.insert_one({
-                "payment_id": payment_id,
-                "rental_id": rental_id,
-                "customer_id": customer_id,
-                "amount": amount,
-                "payment_date": str(payment_date),
-                "payment_method": payment_method,
-                "status": status
-            })
-            st.success("Payment added successfully!")
+            try:
+                payment = {
+                    "payment_id": payment_id,
+                    "rental_id": rental_id,
+                    "customer_id": customer_id,
+                    "amount": amount,
+                    "payment_date": str(payment_date),
+                    "payment_method": payment_method,
+                    "status": status
+                }
+                repository.insert("payments", payment)
+                analytics.record_payments_revenue(db, [payment])
+                analytics.record_payments(db, [payment])
+                reference_cache.invalidate("payments")
+                st.success("Payment added successfully!")
+            except storage.DuplicateKeyError:
+                st.error("A payment with this ID already exists.")
 
     # View Payments
     st.write("### All Payments")
-    payments_data = list(payments.find({}, {"_id": 0}))  # Fetch all payment data
-    if payments_data:
-        st.table(payments_data)  # Display payments in table format
-    else:
-        st.write("No payments found.")
+    paginated_table(payments, "payment_id", ["payment_id", "rental_id", "customer_id", "amount", "payment_date", "payment_method", "status"], "payments_table",
+                    batch_actions={
+                        "Mark Paid": set_selected_payments_status("Paid"),
+                        "Mark Pending": set_selected_payments_status("Pending"),
+                        "Delete Selected": delete_selected_payments,
+                    })
 
 
     # Update Payment Status
@@ -359,11 +1087,15 @@ def manage_payments():
     update_payment_id = st.text_input("Enter Payment ID to Update Status")
     new_status = st.selectbox("New Payment Status", ["Paid", "Pending"], key="status_update")
     if st.button("Update Payment Status"):
-        result = payments.update_one(
+        previous = payments.find_one_and_update(
             {"payment_id": update_payment_id},
             {"$set": {"status": new_status}}
         )
-        if result.matched_count > 0:
+        if previous:
+            if previous["status"] != new_status:
+                analytics.record_payments(db, [previous], sign=-1)
+                analytics.record_payments(db, [{**previous, "status": new_status}])
+                reference_cache.invalidate("payments")
             st.success("Payment status updated successfully!")
         else:
             st.error("Payment not found.")
@@ -371,72 +1103,251 @@ def manage_payments():
     st.write("### Delete Payment")
     payment_id_to_delete = st.text_input("Payment ID to Delete", key="delete_payment")
     if st.button("Delete Payment"):
-        result = payments.delete_one({"payment_id": payment_id_to_delete})
-        if result.deleted_count > 0:
+        deleted = repository.delete("payments", payment_id_to_delete)
+        if deleted:
+            analytics.record_payments_revenue(db, [deleted], sign=-1)
+            analytics.record_payments(db, [deleted], sign=-1)
+            reference_cache.invalidate("payments")
             st.success("Payment deleted successfully!")
         else:
             st.error("Payment not found.")
 
 
-# Function to show total payments over time
-def total_payments_over_time():
-    payments_data = list(payments.find({}, {"_id": 0, "payment_date": 1, "amount": 1}))
-    df = pd.DataFrame(payments_data)
+# Daily revenue rollup, kept up to date on every payment write so charts never scan payments
+PAYMENT_GRANULARITY_FORMATS = {"Day": "%Y-%m-%d", "Week": "%G-W%V", "Month": "%Y-%m"}
 
-    # Convert payment_date to datetime format
-    df['payment_date'] = pd.to_datetime(df['payment_date'], format="ISO8601")
-    
+DAILY_REVENUE_REBUILD = ("daily_revenue_rebuild",)
+
+@st.cache_resource
+def ensure_daily_revenue():
+    """
+    Backfill the rollup on the job runner if it has never been built, once per server
+    process, so a failure there affects only the payments chart and not every page.
+    """
+    job_runner.request(DAILY_REVENUE_REBUILD, "backfill", lambda: analytics.ensure_daily_revenue(db))
+    return True
 
-    # Group by date and sum payments
-    daily_payments = df.groupby(df['payment_date'].dt.date)['amount'].sum().reset_index()
+def rebuild_daily_revenue():
+    analytics.rebuild_daily_revenue(db)
+    # Charts computed from the rollup before the rebuild are out of date
+    reference_cache.invalidate("payments")
 
-    # Plotting
-    fig = px.line(daily_payments, x='payment_date', y='amount', title="Total Payments Over Time")
-    st.plotly_chart(fig)
+PAYMENTS_OVER_TIME_SCHEMA = {"payment_date": pa.string(), "amount": pa.float64(), "payments": pa.int64()}
+
+def fetch_payments_over_time(start_date, end_date, granularity="Day"):
+    """
+    Sum the daily rollup into day, week or month buckets between two dates.
+    The cost depends on the number of days in the range, not the number of payments.
+    """
+    pipeline = [
+        {"$match": {"_id": {"$gte": str(start_date), "$lte": str(end_date)}, "payments": {"$gt": 0}}},
+        {"$group": {
+            "_id": {"$dateToString": {
+                "format": PAYMENT_GRANULARITY_FORMATS[granularity],
+                # The YYYY-MM-DD key as a date; $dateFromParts, unlike $dateFromString, also runs on mongomock
+                "date": {"$dateFromParts": {part: {"$toInt": {"$substr": ["$_id", start, length]}}
+                                            for part, start, length in [("year", 0, 4), ("month", 5, 2), ("day", 8, 2)]}},
+            }},
+            "amount": {"$sum": "$amount"},
+            "payments": {"$sum": "$payments"},
+        }},
+        {"$sort": {"_id": ASCENDING}},
+        {"$project": {"_id": 0, "payment_date": "$_id", "amount": 1, "payments": 1}},
+    ]
+    return storage.aggregate_arrow(daily_revenue, pipeline, PAYMENTS_OVER_TIME_SCHEMA)
+
+# Function to show total payments over time
+def total_payments_over_time():
+    if job_runner.running(DAILY_REVENUE_REBUILD):
+        st.info("The daily revenue rollup is being built; the chart may be incomplete until it finishes.")
+    elif error := job_runner.error(DAILY_REVENUE_REBUILD):
+        st.error(f"The daily revenue rollup could not be built ({error}); the chart may be incomplete.")
+    first_day, last_day = run_concurrently(
+        async_db[daily_revenue.name].find_one({}, sort=[("_id", ASCENDING)]),
+        async_db[daily_revenue.name].find_one({}, sort=[("_id", DESCENDING)]),
+    )
+    if not first_day:
+        st.write("No payments found.")
+        return
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    default_range = [datetime.strptime(first_day["_id"], "%Y-%m-%d").date(),
+                     datetime.strptime(last_day["_id"], "%Y-%m-%d").date()]
+    date_range = col1.date_input("Payment Date Range", value=default_range, key="payments_over_time_range")
+    granularity = col2.selectbox("Granularity", list(PAYMENT_GRANULARITY_FORMATS), key="payments_over_time_granularity")
+    if col3.button("Rebuild Rollup"):
+        job_runner.request(DAILY_REVENUE_REBUILD, f"manual {time.time()}", rebuild_daily_revenue)
+
+    if len(date_range) < 2:
+        st.info("Select a start and end date.")
+        return
+
+    def show_chart(totals):
+        if not totals.num_rows:
+            return False
+        # Plotting
+        fig = px.line(totals.to_pandas(), x='payment_date', y='amount', markers=True,
+                      title="Total Payments Over Time", hover_data=['payments'])
+        st.plotly_chart(fig)
+        st.caption(arrow_memory_caption(totals))
+        return True
+
+    start_date, end_date = date_range
+    background_report(
+        ("payments_over_time", str(start_date), str(end_date), granularity),
+        ("payments",),
+        lambda: fetch_payments_over_time(start_date, end_date, granularity),
+        show_chart,
+        "No payments found in this date range.",
+    )
 
 # Function to show supplier distribution (count of suppliers by vehicle)
-def supplier_distribution():
-    suppliers_data = list(suppliers.find({}, {"_id": 0, "vehicle_id": 1}))
-    vehicle_ids = [supplier['vehicle_id'] for supplier in suppliers_data]
+def fetch_supplier_distribution(top_n=20):
+    """
+    Count suppliers per vehicle name in one aggregation, folding everything past the
+    top_n names into a single "Other" bucket.
+    """
+    pipeline = [
+        {"$lookup": {"from": vehicles.name, "localField": "vehicle_id",
+                     "foreignField": "vehicle_id", "as": "vehicle"}},
+        {"$unwind": "$vehicle"},
+        {"$group": {"_id": "$vehicle.vehicle_name", "count": {"$sum": 1}}},
+        {"$sort": {"count": DESCENDING, "_id": ASCENDING}},
+        {"$facet": {
+            "top": [{"$limit": top_n}],
+            "other": [{"$skip": top_n}, {"$group": {"_id": "Other", "count": {"$sum": "$count"}}}],
+        }},
+    ]
+    result = next(suppliers.aggregate(pipeline), {"top": [], "other": []})
+    return [(row["_id"], row["count"]) for row in result["top"] + result["other"]]
+
+def render_supplier_distribution(top_n):
+    """
+    Render the distribution chart to PNG bytes. The figure is created without pyplot,
+    which keeps global state and is not safe to use from the report job threads.
+    """
+    distribution = fetch_supplier_distribution(top_n)
+    if not distribution:
+        return None
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.barplot(x=[name for name, _ in distribution], y=[count for _, count in distribution], ax=ax)
+    ax.set_xlabel("Vehicle Name")
+    ax.set_ylabel("Suppliers")
+    ax.set_title('Supplier Distribution by Vehicle')
+    ax.tick_params(axis="x", labelrotation=45)
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
 
-    # Get vehicle names
-    vehicles_data = list(vehicles.find({"vehicle_id": {"$in": vehicle_ids}}, {"_id": 0, "vehicle_name": 1}))
-    vehicle_names = [vehicle['vehicle_name'] for vehicle in vehicles_data]
+def supplier_distribution():
+    top_n = st.slider("Vehicles to Show", min_value=5, max_value=50, value=20, key="supplier_distribution_top_n")
+
+    def show_chart(chart):
+        if not chart:
+            return False
+        st.image(chart)
+        return True
+
+    # The chart is rendered in the background once per supplier or vehicle data version
+    background_report(
+        ("supplier_distribution", top_n),
+        ("suppliers", "vehicles"),
+        lambda: render_supplier_distribution(top_n),
+        show_chart,
+        "No suppliers found.",
+    )
 
-    # Create DataFrame for plotting
-    df = pd.DataFrame(vehicle_names, columns=["Vehicle Name"])
+# Reports: read only the summary collections that analytics.py keeps up to date
+REPORT_ROWS = 20
+ANALYTICS_REBUILD = ("analytics_rebuild",)
 
-    # Plotting
-    plt.figure(figsize=(10, 6))
-    sns.countplot(data=df, x='Vehicle Name', order=df['Vehicle Name'].value_counts().index)
-    plt.xticks(rotation=45)
-    plt.title('Supplier Distribution by Vehicle')
-    st.pyplot(plt)
+def request_analytics_rebuild(version):
+    """
+    Rebuild the summary collections on the job runner. A request made while a rebuild
+    runs is queued behind it rather than started alongside it.
+    """
+    job_runner.request(ANALYTICS_REBUILD, version, lambda: analytics.rebuild(db))
 
+@st.cache_resource
+def daily_analytics_rebuild(day):
+    """
+    Rebuild the summary collections in the background once per day per server process,
+    repairing any drift from writes made outside the app without blocking a page.
+    """
+    request_analytics_rebuild(f"daily {day}")
 
-def fetch_customer_details(email):
-    # Fetch the customer from the 'Customers' collection using the email
-    customer = customers.find_one({"email": email})
-    
-    if customer:
-        # Fetch the rental details based on customer_id (assuming customer rents only one vehicle for simplicity)
-        rental = rentals.find_one({"customer_id": customer["customer_id"]})
-        
-        if rental:
-            # Fetch the payment details for the rental
-            payment = payments.find_one({"rental_id": rental["rental_id"]})
-            vehicle = vehicles.find_one({"vehicle_id": rental["vehicle_id"]})  # Fetch vehicle details from rental's vehicle_id
-            
-            if vehicle:
-                # Fetch supplier details based on vehicle's supplier_id
-                supplier = suppliers.find_one({"vehicle_id": vehicle["vehicle_id"]})
-            
-            return customer, rental, payment, vehicle, supplier
-    
-    # Return None for each variable if no data is found
-    return None, None, None, None, None
+def fetch_supplier_revenue_share(limit=REPORT_ROWS):
+    """
+    The top suppliers by revenue with their share of the revenue of all suppliers.
+    """
+    top = list(supplier_stats.find({}).sort("revenue", DESCENDING).limit(limit))
+    total = next(supplier_stats.aggregate([{"$group": {"_id": None, "revenue": {"$sum": "$revenue"}}}]), {}).get("revenue", 0)
+    # The stats are keyed by supplier_id; names are read now, so a rename shows at once
+    names = {supplier["supplier_id"]: supplier["supplier_name"] for supplier in suppliers.find(
+        {"supplier_id": {"$in": [row["_id"] for row in top]}}, {"_id": 0, "supplier_id": 1, "supplier_name": 1})}
+    return [{
+        "Supplier ID": row["_id"],
+        "Supplier": names.get(row["_id"], row["_id"]),
+        "Vehicles": row.get("vehicles", 0),
+        "Rentals": row.get("rentals", 0),
+        "Revenue": row.get("revenue", 0),
+        "Share (%)": round(100 * row.get("revenue", 0) / total, 1) if total else 0,
+    } for row in top]
+
+def reports():
+    st.subheader("Reports")
+    col1, col2 = st.columns([4, 1])
+    if col2.button("Rebuild Now"):
+        request_analytics_rebuild(f"manual {time.time()}")
+    if job_runner.running(ANALYTICS_REBUILD):
+        col1.info("The report data is being rebuilt in the background; figures may be incomplete until it finishes.")
+
+    st.write("### Top-Earning Vehicles")
+    top_vehicles = [{
+        "Vehicle ID": row["_id"],
+        "Revenue": row.get("revenue", 0),
+        "Pending": row.get("pending", 0),
+        "Rentals": row.get("rentals", 0),
+        "Rental Days": row.get("rental_days", 0),
+    } for row in vehicle_stats.find({}).sort("revenue", DESCENDING).limit(REPORT_ROWS)]
+    if top_vehicles:
+        st.dataframe(top_vehicles, hide_index=True)
+    else:
+        st.write("No vehicle revenue yet.")
+
+    st.write("### Outstanding Balances")
+    balances = [{
+        "Customer ID": row["_id"],
+        "Pending": row["pending"],
+        "Paid": row.get("paid", 0),
+        "Payments": row.get("payments", 0),
+        "Rentals": row.get("rentals", 0),
+    } for row in customer_stats.find({"pending": {"$gt": 0}}).sort("pending", DESCENDING).limit(REPORT_ROWS)]
+    if balances:
+        st.dataframe(balances, hide_index=True)
+    else:
+        st.write("No outstanding balances.")
+
+    st.write("### Supplier Revenue Share")
+    share = fetch_supplier_revenue_share()
+    if share:
+        st.plotly_chart(px.pie(pd.DataFrame(share), names="Supplier ID", values="Revenue", hover_name="Supplier",
+                               title="Revenue by Supplier"))
+        st.dataframe(share, hide_index=True)
+    else:
+        st.write("No supplier revenue yet.")
 
 
+def fetch_customer_details(email, page=1, page_size=10):
+    """
+    Fetch a customer with one page of their rentals, latest start date first, in a single join.
+    Each rental carries its payments, vehicle and supplier. Returns the customer, the page
+    of rentals and the customer's total number of rentals.
+    """
+    return repository.customer_details(email, page, page_size)
 
 def customer_dashboard():
     # Customer Dashboard UI
@@ -446,7 +1357,9 @@ def customer_dashboard():
     #Query3 and Query4
     customer_email = st.session_state.get("username", None)  # Assuming email is stored in session state
     if customer_email:
-        customer, rental, payment, vehicle, supplier = fetch_customer_details(customer_email)
+        page_size = 10
+        page = st.session_state.get("customer_rentals_page", 1)
+        customer, customer_rentals, total_rentals = fetch_customer_details(customer_email, page, page_size)
 
         if customer:
             # Display customer details
@@ -460,24 +1373,32 @@ def customer_dashboard():
             tabs = ["Rental and Payment Details", "Rented Vehicle and Supplier Details"]
             selected_tab = st.radio("Select a tab", tabs)
 
-            if selected_tab == "Rental and Payment Details":
-                if rental and payment:
+            if not customer_rentals:
+                st.write("No rental history found .")
+
+            for rental in customer_rentals:
+                vehicle = rental.get("vehicle")
+                supplier = rental.get("supplier")
+
+                if selected_tab == "Rental and Payment Details":
                     # Display rental details
                     st.subheader(f"Rental Details for Rental ID {rental['rental_id']}")
                     st.write(f"Rental ID: {rental['rental_id']}")
                     st.write(f"No. of Days Rented: {rental['no_of_days_rented']}")
+                    if rental.get("start_date"):
+                        st.write(f"Rental Period: {rental['start_date']} to {rental['end_date']}")
 
                     # Display payment details
                     st.subheader(f"Payment Details for Rental ID {rental['rental_id']}")
-                    st.write(f"Payment ID: {payment['payment_id']}")
-                    st.write(f"Amount: ${payment['amount']}")
-                    st.write(f"Payment Date: {payment['payment_date']}")
-                    st.write(f"Payment Status: {payment['status']}")
-                else:
-                    st.write("No rental or payment history found .")
-            
-            elif selected_tab == "Rented Vehicle and Supplier Details":
-                if rental:
+                    if not rental["payments"]:
+                        st.write("No payment history found .")
+                    for payment in rental["payments"]:
+                        st.write(f"Payment ID: {payment['payment_id']}")
+                        st.write(f"Amount: ${payment['amount']}")
+                        st.write(f"Payment Date: {payment['payment_date']}")
+                        st.write(f"Payment Status: {payment['status']}")
+
+                elif selected_tab == "Rented Vehicle and Supplier Details":
                     if vehicle:
                         # Display rented vehicle details
                         st.subheader(f"Rented Vehicle Details for Rental ID {rental['rental_id']}")
@@ -494,54 +1415,120 @@ def customer_dashboard():
                         st.write(f"Supplier Name: {supplier['supplier_name']}")
                         st.write(f"Supplier Contact: {supplier['contact_info']}")
                         st.write(f"Supplier Email: {supplier['email']}")
-                else:
-                    st.write("No rental history found .")
+
+            # Page through the rental history, latest start date first
+            total_pages = max(1, (total_rentals + page_size - 1) // page_size)
+            if total_pages > 1:
+                st.number_input(f"Rental History Page (of {total_pages})", min_value=1,
+                                max_value=total_pages, step=1, key="customer_rentals_page")
         else:
             st.write("You don't have any rentals.")
     else:
         st.write("Please log in to view your details.")
 
 #Query3
+def fetch_pending_payments(limit=100, newest_first=True):
+    """
+    Fetch pending payments joined with their customer and vehicle through the repository
+    (the join the export streams), as an Arrow table of at most `limit` rows.
+    """
+    return repository.pending_payments_table(limit=limit, newest_first=newest_first)
+
 def view_pending_payments():
     """
-    Display all pending payments along with customer and vehicle details.
+    Display pending payments along with customer and vehicle details.
     """
     st.subheader("Pending Payments with Customer and Vehicle Details")
 
-    # Fetch pending payments
-    pending_payments = list(payments.find({"status": "Pending"}))
-    
-    if pending_payments:
-        # Initialize list to store results with customer and vehicle details
-        pending_payment_details = []
-
-        for payment in pending_payments:
-            # Fetch customer details
-            customer = customers.find_one({"customer_id": payment["customer_id"]})
-            # Fetch rental information to get vehicle ID
-            rental = rentals.find_one({"rental_id": payment["rental_id"]})
-            # Fetch vehicle details using vehicle ID from rental
-            vehicle = vehicles.find_one({"vehicle_id": rental["vehicle_id"]}) if rental else None
-
-            if customer and vehicle:
-                pending_payment_details.append({
-                    "Payment ID": payment["payment_id"],
-                    "Customer Name": customer["name"],
-                    "Customer Email": customer["email"],
-                    "Vehicle Name": vehicle["vehicle_name"],
-                    "Amount": payment["amount"],
-                    "Payment Date": payment["payment_date"],
-                    "Payment Status": payment["status"]
-                })
-
-        # Display the pending payments with customer and vehicle details
-        if pending_payment_details:
-            st.table(pending_payment_details)
-        else:
-            st.write("No pending payments found.")
-    else:
-        st.write("No pending payments found.")
+    col1, col2 = st.columns(2)
+    limit = col1.number_input("Rows to Show", min_value=1, max_value=1000, value=100, step=10, key="pending_limit")
+    sort_order = col2.selectbox("Sort by Payment Date", ["Newest First", "Oldest First"], key="pending_sort")
+
+    def show_table(pending_payment_details):
+        if not pending_payment_details.num_rows:
+            return False
+        st.dataframe(pending_payment_details, hide_index=True)
+        st.caption(arrow_memory_caption(pending_payment_details))
+        return True
+
+    # The join runs in the background once per change to the collections it reads
+    newest_first = sort_order == "Newest First"
+    background_report(
+        ("pending_payments", int(limit), newest_first),
+        ("payments", "customers", "rentals", "vehicles"),
+        lambda: fetch_pending_payments(int(limit), newest_first),
+        show_table,
+        "No pending payments found.",
+    )
 #Query4
+def fetch_vehicle_customer_payments(vehicle_id, start_date=None, end_date=None, status=None, page=1, page_size=50):
+    """
+    Fetch the customers and payments for every rental of a vehicle in a single aggregation.
+    Returns one page of payment rows, the totals per customer and the total row count.
+    """
+    payment_filter = {}
+    if status:
+        payment_filter["payment.status"] = status
+    if start_date or end_date:
+        payment_filter["payment.payment_date"] = {}
+        if start_date:
+            payment_filter["payment.payment_date"]["$gte"] = str(start_date)
+        if end_date:
+            payment_filter["payment.payment_date"]["$lte"] = str(end_date)
+
+    pipeline = [
+        {"$match": {"vehicle_id": vehicle_id}},
+        {"$lookup": {"from": payments.name, "localField": "rental_id",
+                     "foreignField": "rental_id", "as": "payment"}},
+        {"$unwind": "$payment"},
+        {"$match": payment_filter},
+        {"$lookup": {"from": customers.name, "localField": "payment.customer_id",
+                     "foreignField": "customer_id", "as": "customer"}},
+        {"$unwind": "$customer"},
+        {"$facet": {
+            "rows": [
+                {"$sort": {"payment.payment_date": DESCENDING, "rental_id": ASCENDING}},
+                {"$skip": (page - 1) * page_size},
+                {"$limit": page_size},
+                {"$project": {
+                    "_id": 0,
+                    "Customer Name": "$customer.name",
+                    "Customer Email": "$customer.email",
+                    "Rental ID": "$rental_id",
+                    "Payment Amount": "$payment.amount",
+                    "Payment Status": "$payment.status",
+                    "Payment Date": "$payment.payment_date",
+                }},
+            ],
+            "totals": [
+                {"$group": {
+                    "_id": "$customer.customer_id",
+                    "Customer Name": {"$first": "$customer.name"},
+                    "Customer Email": {"$first": "$customer.email"},
+                    "Rentals": {"$addToSet": "$rental_id"},
+                    "Payments": {"$sum": 1},
+                    "Total Amount": {"$sum": "$payment.amount"},
+                }},
+                {"$sort": {"Total Amount": DESCENDING}},
+            ],
+            "count": [{"$count": "total"}],
+        }},
+    ]
+    result = next(rentals.aggregate(pipeline), {})
+
+    totals = []
+    for row in result.get("totals", []):
+        totals.append({
+            "Customer ID": row["_id"],
+            "Customer Name": row["Customer Name"],
+            "Customer Email": row["Customer Email"],
+            "Rentals": len(row["Rentals"]),
+            "Payments": row["Payments"],
+            "Total Amount": row["Total Amount"],
+        })
+    count = result.get("count", [])
+    return result.get("rows", []), totals, count[0]["total"] if count else 0
+
 def customers_rented_specific_vehicle():
     """
     Display customers who rented a specific vehicle along with their payment details.
@@ -551,36 +1538,47 @@ def customers_rented_specific_vehicle():
     # Input for vehicle_id to filter by
     vehicle_id_input = st.text_input("Enter Vehicle ID")
 
+    # Optional filters
+    col1, col2 = st.columns(2)
+    status = col1.selectbox("Payment Status", ["All", "Paid", "Pending"], key="vehicle_payment_status")
+    date_range = col2.date_input("Payment Date Range", value=[], key="vehicle_payment_dates")
+    start_date = date_range[0] if len(date_range) > 0 else None
+    end_date = date_range[1] if len(date_range) > 1 else None
+    page_size = 50
+
     if vehicle_id_input:
-        # Fetch all rentals that include the given vehicle_id
-        rentals_with_vehicle = rentals.find({"vehicle_id": vehicle_id_input})
-        
-        # Initialize list to store the customer and payment details
-        customer_payment_details = []
-
-        for rental in rentals_with_vehicle:
-            # Fetch the payment details for each rental
-            payments_for_rental = payments.find({"rental_id": rental["rental_id"]})
-            
-            for payment in payments_for_rental:
-                # Fetch customer details using customer_id from payment
-                customer = customers.find_one({"customer_id": payment["customer_id"]})
-                
-                if customer:
-                    customer_payment_details.append({
-                        "Customer Name": customer["name"],
-                        "Customer Email": customer["email"],
-                        "Rental ID": rental["rental_id"],
-                        "Payment Amount": payment["amount"],
-                        "Payment Status": payment["status"],
-                        "Payment Date": payment["payment_date"],
-                    })
+        page = st.number_input("Page", min_value=1, value=1, step=1, key="vehicle_payment_page")
+        customer_payment_details, customer_totals, total_rows = fetch_vehicle_customer_payments(
+            vehicle_id_input,
+            start_date=start_date,
+            end_date=end_date,
+            status=None if status == "All" else status,
+            page=int(page),
+            page_size=page_size,
+        )
         # Display the results
         if customer_payment_details:
+            st.write(f"Showing page {int(page)} of {(total_rows + page_size - 1) // page_size} ({total_rows} payments)")
             st.table(customer_payment_details)
+            st.write("### Totals per Customer")
+            st.table(customer_totals)
+        elif total_rows:
+            st.write("No more results on this page.")
         else:
             st.write("No customers found for this vehicle or no payments made yet.")
 #Query 5
+def fetch_vehicle_and_supplier(rental_id):
+    """
+    Fetch a rental with its vehicle and supplier. The latter two come from the reference
+    cache, and on a miss they are fetched concurrently.
+    """
+    rental = rentals.find_one({"rental_id": rental_id})
+    if not rental or "vehicle_id" not in rental:
+        return rental, None, None
+    vehicle, supplier = run_concurrently(cached_vehicle_async(rental["vehicle_id"]),
+                                         cached_supplier_for_vehicle_async(rental["vehicle_id"]))
+    return rental, vehicle, supplier
+
 def get_vehicle_and_supplier_details():
     """
     Fetch and display vehicle and supplier details for a specific rental ID.
@@ -591,15 +1589,10 @@ def get_vehicle_and_supplier_details():
     rental_id_input = st.text_input("Enter Rental ID to Fetch Details")
 
     if rental_id_input:
-        # Fetch rental details using the Rental ID
-        rental = rentals.find_one({"rental_id": rental_id_input})
-        
-        if rental:
-            # Fetch vehicle details using vehicle_id from rental
-            vehicle = vehicles.find_one({"vehicle_id": rental["vehicle_id"]}) if "vehicle_id" in rental else None
-            # Fetch supplier details using supplier_id from rental
-            supplier = suppliers.find_one({"vehicle_id": rental["vehicle_id"]}) if "vehicle_id" in rental else None
+        # Fetch rental details using the Rental ID, with the vehicle and supplier it references
+        rental, vehicle, supplier = fetch_vehicle_and_supplier(rental_id_input)
 
+        if rental:
             # Display vehicle details
             if vehicle:
                 st.write("### Vehicle Details")
@@ -624,64 +1617,207 @@ def get_vehicle_and_supplier_details():
             st.error("Rental ID not found. Please check and try again.")
 
 
+# Admin: Bulk Import
+def bulk_import_data():
+    st.subheader("Bulk Import")
+    st.write("Upload a CSV or Parquet file whose columns match the collection's fields. "
+             "Rows are validated like the add forms and imported in chunks.")
+
+    entity = st.selectbox("Import Into", list(bulk_import.ENTITIES), format_func=str.title, key="bulk_import_entity")
+    uploaded_file = st.file_uploader("Data File", type=["csv", "parquet"], key="bulk_import_file")
+
+    if st.button("Import") and uploaded_file:
+        progress = st.empty()
+        report = bulk_import.import_file(
+            db, entity, uploaded_file, uploaded_file.name,
+            progress=lambda r: progress.write(f"{r['rows']} rows processed, {r['inserted']} inserted, {r['failed']} failed"),
+        )
+        reference_cache.invalidate(entity)
+        if entity in ("rentals", "vehicles"):
+            # Derive availability for imported bookings and for vehicles whose ID is already booked
+            sync_availability_status()
+
+        st.success(f"Imported {report['inserted']} of {report['rows']} rows in {report['seconds']}s "
+                   f"({report['rows_per_second']} rows/s).")
+        if report["failed"]:
+            st.error(f"{report['failed']} rows failed.")
+            st.dataframe(report["errors"], hide_index=True)
+
+# Admin: Export. The file is built in memory from a batched cursor, at most EXPORT_MAX_ROWS
+# rows, on a job runner of its own; the session keeps only the job's key and version. It is
+# sent with st.download_button, so only a logged-in admin can fetch it. Larger exports are
+# for export.py.
+@st.cache_resource
+def get_export_runner():
+    """
+    Create the export job runner once per server process. It keeps at most EXPORT_MAX_FILES
+    prepared files, and they do not expire: a file is never rebuilt behind the admin's back.
+    """
+    return JobRunner(REPORT_JOB_WORKERS, float("inf"), EXPORT_MAX_FILES)
+
+export_runner = get_export_runner()
+
+def prepare_export(kind, file_format, start_date, end_date, status):
+    started = time.perf_counter()
+    data, rows, truncated = export.export_to_bytes(db, kind, file_format, start_date, end_date, status,
+                                                   max_rows=EXPORT_MAX_ROWS)
+    return {"data": data, "file_name": f"{kind}_{date.today():%Y%m%d}.{export.FORMATS[file_format]}",
+            "rows": rows, "truncated": truncated, "seconds": round(time.perf_counter() - started, 2)}
+
+def discard_export():
+    handle = st.session_state.pop("export", None)
+    if handle:
+        export_runner.discard(handle["key"])
+
+def export_data():
+    st.subheader("Export")
+    col1, col2, col3 = st.columns(3)
+    kind = col1.selectbox("Data", list(export.EXPORTS), format_func=lambda kind: kind.replace("_", " ").title(), key="export_kind")
+    file_format = col2.selectbox("Format", list(export.FORMATS), key="export_format")
+    status = col3.selectbox("Status", ["Any"] + schema.PAYMENT_STATUSES, key="export_status",
+                            disabled=not export.EXPORTS[kind][3])
+    date_range = st.date_input("Date Range (leave empty for all dates)", value=[], key="export_range")
+
+    start_date, end_date = (list(date_range) + [None, None])[:2]
+    request = (kind, file_format, start_date, end_date, status if export.EXPORTS[kind][3] and status != "Any" else None)
+    if st.button("Prepare Export"):
+        # One export per session: a new one replaces the file of the last
+        discard_export()
+        key = ("export", st.session_state.setdefault("export_token", os.urandom(16).hex()))
+        handle = {"request": request, "key": key, "version": f"{request} {time.time()}"}
+        export_runner.request(handle["key"], handle["version"], lambda: prepare_export(*request))
+        st.session_state["export"] = handle
+    handle = st.session_state.get("export")
+    if not handle:
+        return
+    if handle["request"] != request:
+        # Changing the filters discards a prepared file
+        discard_export()
+        return
+    _, done, error = export_runner.peek(handle["key"], handle["version"])
+
+    @st.fragment(run_every=None if done or error else REPORT_JOB_POLL_SECONDS)
+    def show():
+        result, now_done, now_error = export_runner.peek(handle["key"], handle["version"])
+        if (now_done or now_error) and not (done or error):
+            st.rerun()
+        if now_error:
+            st.error(f"The export failed ({now_error}).")
+            return
+        if not now_done:
+            if export_runner.running(handle["key"]):
+                st.info("Preparing the export...")
+            else:
+                st.warning("The prepared file was dropped to make room for newer exports. Prepare it again.")
+            return
+        prepared = result["value"]
+        if not prepared["rows"]:
+            st.write("No rows match these filters.")
+            return
+        # Downloading hands the file to the browser, so the runner's copy is dropped
+        st.download_button(f"Download {prepared['file_name']}", prepared["data"],
+                           file_name=prepared["file_name"], on_click=discard_export)
+        st.caption(f"{prepared['rows']} rows · {len(prepared['data']) / 1e6:.1f} MB · prepared in {prepared['seconds']}s")
+        if prepared["truncated"]:
+            st.warning(f"Only the first {EXPORT_MAX_ROWS} rows were exported. Narrow the date range, "
+                       "or run export.py for the full export.")
+
+    show()
+
+# Admin dashboard sections and the functions that render them
+ADMIN_SECTIONS = {
+    "Manage Customers": [manage_customers],
+    "Manage Vehicles": [manage_vehicles],
+    "Manage Rentals": [manage_rentals],
+    "Manage Supplier": [manage_suppliers],
+    "Manage Payments": [manage_payments],
+    "Pending Payments": [view_pending_payments],
+    "Rental Specific Info": [customers_rented_specific_vehicle, get_vehicle_and_supplier_details],
+    "Vizualisations": [total_payments_over_time, supplier_distribution],
+    "Reports": [reports],
+    "Bulk Import": [bulk_import_data],
+    "Export": [export_data],
+}
+
 def admin_dashboard():
     st.title("Admin Dashboard")
     st.write("Welcome, Admin!")
-    # Tabs for managing collections
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs(["Manage Customers", "Manage Vehicles", "Manage Rentals", "Manage Supplier", "Manage Payments","Pending Payments", "Rental Specific Info", "Vizualisations"])
-    with tab1:
-        manage_customers()
-    with tab2:
-        manage_vehicles()
-    with tab3:
-        manage_rentals()
-    with tab4:
-        manage_suppliers()
-    with tab5:
-        manage_payments()
-    with tab6:
-        view_pending_payments()
-    with tab7:
-        customers_rented_specific_vehicle()
-        get_vehicle_and_supplier_details()
-    with tab8:
-        total_payments_over_time()
-        supplier_distribution() 
-        
-def set_background_image(image_path):
-    with open(image_path, "rb") as image_file:
-        base64_image = base64.b64encode(image_file.read()).decode("utf-8")
+    # Only the selected section runs its queries and charts; the choice is kept in session state
+    section = st.radio("Section", list(ADMIN_SECTIONS), horizontal=True, key="admin_section", label_visibility="collapsed")
+    for render in ADMIN_SECTIONS[section]:
+        render()
 
-    st.markdown(
-        f"""
+# Static assets: compressed, content-hashed copies served from ./static
+BACKGROUND_MAX_SIZE = (1920, 1080)
+BACKGROUND_JPEG_QUALITY = 65
+
+@st.cache_resource
+def build_background_asset(image_path):
+    """
+    Resize and recompress the background once per server process and write it to the
+    static folder under a content-hashed name. Returns the file name and the bytes.
+    """
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+        image.thumbnail(BACKGROUND_MAX_SIZE)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=BACKGROUND_JPEG_QUALITY, optimize=True, progressive=True)
+    data = buffer.getvalue()
+
+    file_name = f"background.{hashlib.sha256(data).hexdigest()[:16]}.jpg"
+    file_path = os.path.join(STATIC_DIR, file_name)
+    if not os.path.exists(file_path):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        with open(file_path, "wb") as asset_file:
+            asset_file.write(data)
+    return file_name, data
+
+@st.cache_resource
+def background_css(image_path):
+    """
+    Build the background CSS once per server process. With static serving enabled the
+    image is referenced by URL, so reruns only resend a few hundred bytes of CSS and the
+    browser revalidates the file with its ETag instead of downloading it again. Streamlit
+    sets no Cache-Control on static files; the hashed name and ?v= make it safe for a
+    reverse proxy to mark them immutable. Otherwise the compressed image is inlined
+    once-encoded.
+    """
+    file_name, data = build_background_asset(image_path)
+    if st.get_option("server.enableStaticServing"):
+        url = f"app/static/{file_name}?v={file_name.split('.')[1]}"
+    else:
+        url = f"data:image/jpeg;base64,{base64.b64encode(data).decode('utf-8')}"
+    return f"""
         <style>
         .stApp {{
-            background: url("data:image/jpeg;base64,{base64_image}");
+            background: url("{url}");
             background-size: cover;
             background-position: center;
             height: 100vh;
         }}
         </style>
-        """,
-        unsafe_allow_html=True
-    )
+        """
+
+def set_background_image(image_path):
+    st.markdown(background_css(image_path), unsafe_allow_html=True)
 
 # Registration function
 def register_user(username, password, role, email=None):
-    # Check if the username (email) already exists
-    if users.find_one({"username": username}):
-        return "User already exists."
-    # Insert new user into the database
+    # Insert new user into the database, the unique index on username rejects existing users
     if role == "customer":
         # Insert only email and password for customers
-        users.insert_one({"username": username, "password": password, "role": role, "email": email})
+        user = {"username": username, "password": password, "role": role, "email": email}
     else:
-        users.insert_one({"username": username, "password": password, "role": role})
+        user = {"username": username, "password": password, "role": role}
+    try:
+        repository.insert("users", user)
+    except storage.DuplicateKeyError:
+        return "User already exists."
     return "User registered successfully!"
 
 # Login page
 def login():
-    set_background_image("./background.jpg")
+    set_background_image(os.path.join(APP_DIR, "background.jpg"))
     st.title("Vehicle Rental Management System - Login")
 
     # Tabs for Login and Register
@@ -698,7 +1834,7 @@ def login():
                 st.session_state["username"] = username
                 st.session_state["role"] = user["role"]
                 st.success(f"Welcome {username}!")
-                st.experimental_rerun()
+                st.rerun()
             else:
                 st.error("Invalid credentials!")
 
@@ -722,12 +1858,43 @@ def login():
 
 # Main Application
 def main():
+    # The toggle's value from the previous rerun decides whether this rerun is recorded
+    profiling = st.session_state.get("role") == "admin" and st.session_state.get("query_profiler", False)
+    if profiling:
+        query_profiler.start_run()
+    try:
+        run_app()
+    finally:
+        records = query_profiler.end_run() if profiling else None
+    if st.session_state.get("role") == "admin":
+        st.sidebar.toggle("Profile queries", key="query_profiler")
+        if records is not None:
+            query_profiler_panel(records)
+
+def run_app():
+    # No ping per rerun: the first command of a rerun fails within the server-selection
+    # timeout when the server is down, and only that is reported as unreachable
+    try:
+        prepare_database()
+        show_page()
+    except (ServerSelectionTimeoutError, ConnectionFailure) as e:
+        st.error(f"The database is currently unreachable ({e.__class__.__name__}). Please try again shortly.")
+
+def show_page():
     if "username" not in st.session_state:
         login()
     else:
         st.sidebar.button("Logout", on_click=lambda: st.session_state.clear())
         role = st.session_state["role"]
         if role == "admin":
+            for problem in ensure_indexes():
+                st.warning(problem)
+            with st.sidebar.expander("Connection Pool"):
+                st.json(pool_stats.snapshot())
+            with st.sidebar.expander("Reference Cache"):
+                st.json(reference_cache.stats())
+            with st.sidebar.expander("Report Jobs"):
+                st.json(job_runner.stats())
             admin_dashboard()
         elif role == "customer":
             customer_dashboard()
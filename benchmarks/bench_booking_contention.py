@@ -0,0 +1,87 @@
+"""
+Booking contention check: many threads book the same vehicle for overlapping periods at
+once through app.book_vehicle, the path the Manage Rentals form uses. Exactly one booking
+must succeed; the others must be rejected as overlapping or busy, never double booked.
+
+    python benchmarks/bench_booking_contention.py --threads 32
+    python benchmarks/bench_booking_contention.py --backend mongomock
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from bench_queries import AsyncMongomock  # noqa: E402
+
+VEHICLE_ID = "V-CONTENTION"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Book one vehicle from many threads at once.")
+    parser.add_argument("--backend", choices=["mongod", "mongomock"], default="mongod")
+    parser.add_argument("--uri", default=os.environ.get("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="vehicle_rental_benchmark")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["MONGODB_URI"] = args.uri
+    os.environ["MONGODB_DB"] = args.db
+    if args.backend == "mongomock":
+        import mongomock
+        import pymongo
+
+        shared_client = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *a, **kw: shared_client
+        pymongo.AsyncMongoClient = lambda *a, **kw: AsyncMongomock(shared_client)
+    import app
+
+    app.ensure_indexes()
+    app.vehicles.delete_many({"vehicle_id": VEHICLE_ID})
+    app.vehicles.insert_one({"vehicle_id": VEHICLE_ID, "vehicle_name": "Contention Test", "type": "car",
+                             "brand": "Test", "availability_status": "Available"})
+
+    failures = 0
+    for round_number in range(args.rounds):
+        app.rentals.delete_many({"vehicle_id": VEHICLE_ID})
+        start_date = date.today() + timedelta(days=round_number)
+        barrier = threading.Barrier(args.threads)
+        outcomes = Counter()
+        latencies = []
+
+        def book(i):
+            # Every thread books an overlapping period: same start, 1 to 3 days
+            end_date = start_date + timedelta(days=1 + i % 3)
+            rental = {"rental_id": f"R-CONTENTION-{round_number}-{i}", "customer_id": "C-CONTENTION",
+                      "vehicle_id": VEHICLE_ID, "no_of_days_rented": (end_date - start_date).days,
+                      "start_date": str(start_date), "end_date": str(end_date)}
+            barrier.wait()
+            started = time.perf_counter()
+            error = app.book_vehicle(VEHICLE_ID, start_date, end_date, lambda: app.rentals.insert_one(rental))
+            latencies.append(time.perf_counter() - started)
+            outcomes["booked" if error is None else "busy" if "another admin" in error else "overlap"] += 1
+
+        threads = [threading.Thread(target=book, args=(i,)) for i in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stored = app.rentals.count_documents({"vehicle_id": VEHICLE_ID})
+        ok = outcomes["booked"] == 1 and stored == 1
+        failures += not ok
+        print(f"round {round_number + 1}: {dict(outcomes)}, {stored} stored, "
+              f"max latency {max(latencies) * 1000:.0f} ms {'OK' if ok else 'DOUBLE BOOKED' if stored > 1 else 'FAILED'}")
+
+    app.rentals.delete_many({"vehicle_id": VEHICLE_ID})
+    app.vehicles.delete_many({"vehicle_id": VEHICLE_ID})
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Benchmark customers_rented_specific_vehicle: the old nested find loop against the
+single aggregation in fetch_vehicle_customer_payments.
+
+Seeds a throwaway database on a local mongod, then times both versions and counts
+the commands each one sends to the server.
+
+    python benchmarks/bench_customers_rented_vehicle.py --rentals 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app  # noqa: E402
+from command_counter import CommandCounter  # noqa: E402
+
+
+def seed(db, n_rentals, n_customers):
+    # One popular vehicle with n_rentals rentals and one or two payments per rental
+    for name in ["Customers", "Vehicles", "Rentals", "Payments"]:
+        db[name].drop()
+    rng = random.Random(42)
+    db["Customers"].insert_many([
+        {"customer_id": f"C{i}", "name": f"Customer {i}", "email": f"c{i}@example.com", "phone": str(i)}
+        for i in range(n_customers)
+    ])
+    db["Vehicles"].insert_one({"vehicle_id": "V1", "vehicle_name": "Bench Car", "type": "car",
+                               "brand": "Bench", "availability_status": "Available"})
+    rentals_data, payments_data = [], []
+    for i in range(n_rentals):
+        customer_id = f"C{rng.randrange(n_customers)}"
+        rentals_data.append({"rental_id": f"R{i}", "customer_id": customer_id,
+                             "vehicle_id": "V1", "no_of_days_rented": rng.randint(1, 14)})
+        for j in range(rng.randint(1, 2)):
+            payments_data.append({
+                "payment_id": f"P{i}-{j}", "rental_id": f"R{i}", "customer_id": customer_id,
+                "amount": round(rng.uniform(20, 500), 2),
+                "payment_date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "payment_method": "Cash", "status": rng.choice(["Paid", "Pending"]),
+            })
+    db["Rentals"].insert_many(rentals_data)
+    db["Payments"].insert_many(payments_data)
+
+
+def legacy_loop(vehicle_id):
+    # The implementation customers_rented_specific_vehicle used before the aggregation
+    customer_payment_details = []
+    for rental in app.rentals.find({"vehicle_id": vehicle_id}):
+        for payment in app.payments.find({"rental_id": rental["rental_id"]}):
+            customer = app.customers.find_one({"customer_id": payment["customer_id"]})
+            if customer:
+                customer_payment_details.append({
+                    "Customer Name": customer["name"],
+                    "Customer Email": customer["email"],
+                    "Rental ID": rental["rental_id"],
+                    "Payment Amount": payment["amount"],
+                    "Payment Status": payment["status"],
+                    "Payment Date": payment["payment_date"],
+                })
+    return customer_payment_details
+
+
+def aggregation(vehicle_id):
+    return app.fetch_vehicle_customer_payments(vehicle_id, page_size=10 ** 9)[0]
+
+
+def run(label, fn, counter, repeat):
+    timings = []
+    for _ in range(repeat):
+        counter.count = 0
+        start = time.perf_counter()
+        rows = fn("V1")
+        timings.append(time.perf_counter() - start)
+    print(f"{label:<12} rows={len(rows):<7} commands={counter.count:<7} best={min(timings) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--uri", default=os.environ.get("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="vehicle_rental_benchmark")
+    parser.add_argument("--rentals", type=int, default=5000)
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    db = MongoClient(args.uri, event_listeners=[counter])[args.db]
+    seed(db, args.rentals, args.customers)
+
+    # Point the app's collections at the benchmark database and index them the same way
+    app.customers, app.vehicles = db["Customers"], db["Vehicles"]
+    app.rentals, app.payments = db["Rentals"], db["Payments"]
+    db["Customers"].create_index("customer_id", unique=True)
+    db["Rentals"].create_index("vehicle_id")
+    db["Payments"].create_index("rental_id")
+
+    run("loop", legacy_loop, counter, args.repeat)
+    run("aggregation", aggregation, counter, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
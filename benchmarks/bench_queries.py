@@ -0,0 +1,209 @@
+"""
+Benchmark suite for the app's query functions.
+
+Seeds a benchmark database with generate_data.py (unless --no-seed), builds the daily
+revenue rollup, then times each query function and counts the commands it sends to the
+server. Results are compared with the baseline committed in baseline.json for the same
+backend and scale, so regressions in wall time or round trips are caught. A run with no
+baseline for its backend and scale fails.
+
+    python benchmarks/bench_queries.py                                  # mongomock, scale 0.001
+    python benchmarks/bench_queries.py --backend mongod --scale 0.1 --save-baseline
+    python benchmarks/bench_queries.py --backend mongod --scale 0.1
+
+baseline.json holds one entry per backend and scale; --save-baseline replaces only the
+entry of the current run. The default, in-process mongomock backend needs no server, so
+its committed entry gates every run; its command counts are exact and its times are
+mongomock's, not a server's. Wall times depend on the machine, so record a mongod entry
+on the machine that runs the comparison.
+
+mongomock does not implement every aggregation operator the app uses, so some benchmarks
+are reported as unsupported there. It publishes no command events, so its collection
+calls are counted instead (see command_counter.count_mongomock_commands).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import analytics  # noqa: E402
+import generate_data  # noqa: E402
+from command_counter import CommandCounter, count_mongomock_commands  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+class AsyncMongomock:
+    """
+    Minimal AsyncMongoClient stand-in over a mongomock client, covering the calls the app
+    makes through run_concurrently: awaitable collection methods and find(...).to_list().
+    """
+    def __init__(self, target):
+        self._target = target
+
+    def __getitem__(self, name):
+        return AsyncMongomock(self._target[name])
+
+    def find(self, *args, **kwargs):
+        return AsyncMongomock(self._target.find(*args, **kwargs))
+
+    def sort(self, *args, **kwargs):
+        return AsyncMongomock(self._target.sort(*args, **kwargs))
+
+    def limit(self, *args):
+        return AsyncMongomock(self._target.limit(*args))
+
+    async def to_list(self, length=None):
+        return list(self._target)[:length]
+
+    def __getattr__(self, name):
+        method = getattr(self._target, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+def benchmarks(app):
+    """
+    The query functions to time, with arguments that hit the most popular vehicle and
+    customer (rank 0 in the generator's skewed distribution).
+    """
+    hot_vehicle = generate_data.vehicle_id(0)
+    hot_customer = "customer0@example.com"
+    first_day = generate_data.FIRST_DAY
+    last_day = first_day + timedelta(days=generate_data.DAYS)
+
+    def vehicle_and_supplier():
+        # Measure the database path, not the reference cache
+        app.reference_cache.invalidate("vehicles")
+        app.reference_cache.invalidate("suppliers")
+        return app.fetch_vehicle_and_supplier("R00000000")
+
+    return {
+        "view_pending_payments": lambda: app.fetch_pending_payments(limit=100),
+        "customers_rented_specific_vehicle": lambda: app.fetch_vehicle_customer_payments(hot_vehicle),
+        "fetch_customer_details": lambda: app.fetch_customer_details(hot_customer),
+        "get_vehicle_and_supplier_details": vehicle_and_supplier,
+        "total_payments_over_time": lambda: app.fetch_payments_over_time(first_day, last_day, "Week"),
+        "supplier_distribution": lambda: app.fetch_supplier_distribution(top_n=20),
+    }
+
+
+def run_benchmark(fn, counter, repeat):
+    fn()  # Warm up connections and server caches
+    timings, commands = [], []
+    for _ in range(repeat):
+        counter.count = 0
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+        commands.append(counter.count)
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "min_ms": round(min(timings) * 1000, 2),
+        "commands": max(commands),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """
+    Return the regressions: more commands than the baseline, or a median time more than
+    `tolerance` (a fraction) and at least min_delta_ms slower, so timer noise on very
+    fast queries is not reported.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected and "error" in result and "error" not in expected:
+            regressions.append(f"{name}: {result['error']}, baseline ran")
+        if not expected or "error" in result or "error" in expected:
+            continue
+        if result["commands"] > expected["commands"]:
+            regressions.append(f"{name}: {result['commands']} commands, baseline {expected['commands']}")
+        slower_ms = result["median_ms"] - expected["median_ms"]
+        if result["median_ms"] > expected["median_ms"] * (1 + tolerance) and slower_ms >= min_delta_ms:
+            regressions.append(f"{name}: {result['median_ms']} ms, baseline {expected['median_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the app's query functions against seeded data.")
+    parser.add_argument("--backend", choices=["mongod", "mongomock"], default="mongomock")
+    parser.add_argument("--uri", default=os.environ.get("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="vehicle_rental_benchmark")
+    parser.add_argument("--scale", type=float, default=0.001, help="fraction of generate_data's default volumes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data already in --db")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    # The app reads its connection settings when imported, and the listener must be
+    # registered before the app creates its client
+    os.environ["MONGODB_URI"] = args.uri
+    os.environ["MONGODB_DB"] = args.db
+    counter = CommandCounter()
+    monitoring.register(counter)
+    if args.backend == "mongomock":
+        import mongomock
+        import pymongo
+
+        count_mongomock_commands(counter)
+        shared_client = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *a, **kw: shared_client
+        pymongo.AsyncMongoClient = lambda *a, **kw: AsyncMongomock(shared_client)
+    import app
+
+    sizes = {name: max(1, int(size * args.scale)) for name, size in generate_data.DEFAULT_SIZES.items()}
+    if not args.no_seed:
+        generate_data.generate(app.db, sizes, args.seed)
+    app.ensure_indexes()
+    # Built here rather than by the app's background backfill, so the chart is timed on it
+    analytics.rebuild_daily_revenue(app.db)
+
+    results = {}
+    for name, fn in benchmarks(app).items():
+        try:
+            results[name] = run_benchmark(fn, counter, args.repeat)
+        except NotImplementedError as e:
+            results[name] = {"error": f"unsupported by {args.backend}: {e}"}
+        line = results[name].get("error") or "{median_ms:>9} ms median {min_ms:>9} ms min {commands:>4} commands".format(**results[name])
+        print(f"{name:<36} {line}")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baselines = json.load(baseline_file)
+    baseline_key = f"{args.backend}@{args.scale:g}"
+
+    if args.save_baseline:
+        baselines[baseline_key] = results
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"baseline {baseline_key} saved to {args.baseline}")
+        return 0
+
+    if baseline_key not in baselines:
+        print(f"FAILED: no {baseline_key} baseline in {args.baseline} (recorded: {', '.join(baselines) or 'none'}); "
+              "run with --save-baseline first")
+        return 1
+    regressions = compare(results, baselines[baseline_key], args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
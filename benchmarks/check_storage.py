@@ -0,0 +1,220 @@
+"""
+Conformance checks for the storage backends in storage.py.
+
+Every check runs against a fresh, empty repository of each backend, so the MongoDB and
+embedded implementations are held to the same behaviour, including the results of the
+customer details and pending payments joins. Exits non-zero if any check fails.
+
+    python benchmarks/check_storage.py                       # sqlite, and mongod if reachable
+    python benchmarks/check_storage.py --backend sqlite
+    python benchmarks/check_storage.py --backend mongomock   # joins mongomock lacks are reported as unsupported
+"""
+import argparse
+import os
+import sys
+import traceback
+
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import storage  # noqa: E402
+
+CUSTOMERS = [
+    {"customer_id": "C1", "name": "Ana Silva", "email": "ana@example.com", "phone": "900"},
+    {"customer_id": "C2", "name": "Ben Kim", "email": "ben@example.com", "phone": "901"},
+]
+VEHICLES = [
+    {"vehicle_id": "V1", "vehicle_name": "Toyota Corolla", "type": "car", "brand": "Toyota", "availability_status": "Available"},
+    {"vehicle_id": "V2", "vehicle_name": "Ford Transit", "type": "van", "brand": "Ford", "availability_status": "Available"},
+    {"vehicle_id": "V3", "vehicle_name": "Bajaj Pulsar", "type": "bike", "brand": "Bajaj", "availability_status": "Available"},
+]
+SUPPLIERS = [
+    {"supplier_id": "S1", "supplier_name": "Fleet One", "contact_info": "800", "email": "one@example.com", "vehicle_id": "V1"},
+    {"supplier_id": "S2", "supplier_name": "Fleet Two", "contact_info": "801", "email": "two@example.com", "vehicle_id": "V1"},
+    {"supplier_id": "S3", "supplier_name": "Fleet Two", "contact_info": "801", "email": "two@example.com", "vehicle_id": "V2"},
+]
+RENTALS = [
+    {"rental_id": "R1", "customer_id": "C1", "vehicle_id": "V1", "no_of_days_rented": 2, "start_date": "2024-01-01", "end_date": "2024-01-03"},
+    {"rental_id": "R2", "customer_id": "C1", "vehicle_id": "V2", "no_of_days_rented": 1, "start_date": "2024-02-01", "end_date": "2024-02-02"},
+    {"rental_id": "R3", "customer_id": "C2", "vehicle_id": "V3", "no_of_days_rented": 3, "start_date": "2024-03-01", "end_date": "2024-03-04"},
+    {"rental_id": "R4", "customer_id": "C1", "vehicle_id": "V9", "no_of_days_rented": 1, "start_date": "2024-04-01", "end_date": "2024-04-02"},
+]
+PAYMENTS = [
+    {"payment_id": "P1", "rental_id": "R1", "customer_id": "C1", "amount": 90.0, "payment_date": "2024-01-01", "payment_method": "Cash", "status": "Paid"},
+    {"payment_id": "P2", "rental_id": "R1", "customer_id": "C1", "amount": 10.5, "payment_date": "2024-01-05", "payment_method": "PayPal", "status": "Pending"},
+    {"payment_id": "P3", "rental_id": "R2", "customer_id": "C1", "amount": 80.0, "payment_date": "2024-02-01", "payment_method": "Cash", "status": "Pending"},
+    {"payment_id": "P4", "rental_id": "R3", "customer_id": "C2", "amount": 45.0, "payment_date": "2024-03-01", "payment_method": "Debit Card", "status": "Pending"},
+    {"payment_id": "P5", "rental_id": "R4", "customer_id": "C1", "amount": 15.0, "payment_date": "2024-04-01", "payment_method": "Cash", "status": "Pending"},
+    {"payment_id": "P6", "rental_id": "R9", "customer_id": "C2", "amount": 5.0, "payment_date": "2024-05-01", "payment_method": "Cash", "status": "Pending"},
+]
+
+
+def seed(repository):
+    for entity, documents in [("customers", CUSTOMERS), ("vehicles", VEHICLES), ("suppliers", SUPPLIERS),
+                              ("rentals", RENTALS), ("payments", PAYMENTS)]:
+        assert repository.insert_many(entity, documents) == len(documents)
+
+
+def check_insert_and_get(repository):
+    repository.insert("users", {"username": "admin@example.com", "password": "admin", "role": "admin"})
+    assert repository.get("users", "admin@example.com") == {"username": "admin@example.com", "password": "admin", "role": "admin"}
+    assert repository.get("users", "nobody@example.com") is None
+
+
+def check_duplicate_keys(repository):
+    repository.insert("customers", CUSTOMERS[0])
+    try:
+        repository.insert("customers", {**CUSTOMERS[1], "customer_id": "C1"})
+    except storage.DuplicateKeyError:
+        pass
+    else:
+        raise AssertionError("duplicate insert was accepted")
+    assert repository.insert_many("customers", CUSTOMERS) == 1
+    try:
+        repository.update("customers", "C2", {"customer_id": "C1"})
+    except storage.DuplicateKeyError:
+        pass
+    else:
+        raise AssertionError("update to a taken key was accepted")
+
+
+def check_find_and_count(repository):
+    seed(repository)
+    assert [payment["payment_id"] for payment in repository.find("payments", {"customer_id": "C1", "status": "Pending"})] == ["P2", "P3", "P5"]
+    assert [rental["rental_id"] for rental in repository.find("rentals", sort=[("start_date", DESCENDING)], skip=1, limit=2)] == ["R3", "R2"]
+    assert [payment["payment_id"] for payment in repository.find("payments", sort=[("amount", ASCENDING)], limit=2)] == ["P6", "P2"]
+    assert repository.find("payments", {"amount": 90}) == [PAYMENTS[0]]
+    assert repository.count("payments") == len(PAYMENTS)
+    assert repository.count("payments", {"status": "Pending"}) == 5
+    assert repository.count("rentals", {"customer_id": "C9"}) == 0
+
+
+def check_update_and_delete(repository):
+    seed(repository)
+    assert repository.update("vehicles", "V1", {"availability_status": "Unavailable", "search_keys": ["toyota", "corolla"]})
+    assert repository.get("vehicles", "V1") == {**VEHICLES[0], "availability_status": "Unavailable", "search_keys": ["toyota", "corolla"]}
+    assert not repository.update("vehicles", "V9", {"availability_status": "Unavailable"})
+    assert repository.update("customers", "C2", {"customer_id": "C3"})
+    assert repository.get("customers", "C2") is None and repository.get("customers", "C3")["name"] == "Ben Kim"
+    assert repository.delete("payments", "P1") == PAYMENTS[0]
+    assert repository.delete("payments", "P1") is None
+    assert repository.count("payments") == len(PAYMENTS) - 1
+
+
+def check_customer_details(repository):
+    seed(repository)
+    # Added last but back-dated, so it is the oldest of Ana's rentals
+    back_dated = {"rental_id": "R5", "customer_id": "C1", "vehicle_id": "V1", "no_of_days_rented": 1,
+                  "start_date": "2023-12-01", "end_date": "2023-12-02"}
+    repository.insert("rentals", back_dated)
+    customer, rentals, total = repository.customer_details("ana@example.com", page=1, page_size=2)
+    assert customer == CUSTOMERS[0]
+    assert total == 4
+    # Latest start date first: R4 has no vehicle or supplier, R2's vehicle has one supplier
+    assert [rental["rental_id"] for rental in rentals] == ["R4", "R2"]
+    assert rentals[0] == {**RENTALS[3], "payments": [PAYMENTS[4]]}
+    assert rentals[1] == {**RENTALS[1], "payments": [PAYMENTS[2]], "vehicle": VEHICLES[1], "supplier": SUPPLIERS[2]}
+
+    # V1 has three suppliers; R1 still appears once, with the lowest supplier_id of them
+    # although S0 was added last
+    first_supplier = {**SUPPLIERS[1], "supplier_id": "S0"}
+    repository.insert("suppliers", first_supplier)
+    _, rentals, _ = repository.customer_details("ana@example.com", page=2, page_size=2)
+    assert rentals == [{**RENTALS[0], "payments": PAYMENTS[:2], "vehicle": VEHICLES[0], "supplier": first_supplier},
+                       {**back_dated, "payments": [], "vehicle": VEHICLES[0], "supplier": first_supplier}]
+
+    _, rentals, total = repository.customer_details("ben@example.com")
+    assert total == 1 and rentals == [{**RENTALS[2], "payments": [PAYMENTS[3]], "vehicle": VEHICLES[2]}]
+    assert repository.customer_details("nobody@example.com") == (None, [], 0)
+
+
+def check_pending_payments(repository):
+    seed(repository)
+    # P5's vehicle and P6's rental do not exist, so both are dropped by the join
+    assert repository.pending_payments() == [
+        {"Payment ID": "P4", "Customer Name": "Ben Kim", "Customer Email": "ben@example.com", "Vehicle Name": "Bajaj Pulsar",
+         "Amount": 45.0, "Payment Date": "2024-03-01", "Payment Status": "Pending"},
+        {"Payment ID": "P3", "Customer Name": "Ana Silva", "Customer Email": "ana@example.com", "Vehicle Name": "Ford Transit",
+         "Amount": 80.0, "Payment Date": "2024-02-01", "Payment Status": "Pending"},
+        {"Payment ID": "P2", "Customer Name": "Ana Silva", "Customer Email": "ana@example.com", "Vehicle Name": "Toyota Corolla",
+         "Amount": 10.5, "Payment Date": "2024-01-05", "Payment Status": "Pending"},
+    ]
+    assert [row["Payment ID"] for row in repository.pending_payments(newest_first=False)] == ["P2", "P3", "P4"]
+    # The limit counts only joined rows: P5 and P6, the newest pending payments, do not use it up
+    assert [row["Payment ID"] for row in repository.pending_payments(limit=2)] == ["P4", "P3"]
+
+    # Payments of one date come in payment_id order, whatever order they were inserted in
+    same_day = {key: value for key, value in PAYMENTS[3].items() if key != "payment_id"}
+    repository.insert_many("payments", [{**same_day, "payment_id": "P8"}, {**same_day, "payment_id": "P7"}])
+    assert [row["Payment ID"] for row in repository.pending_payments(limit=3)] == ["P8", "P7", "P4"]
+    assert [row["Payment ID"] for row in repository.pending_payments(newest_first=False)] == ["P2", "P3", "P4", "P7", "P8"]
+
+
+def check_pending_payments_table(repository):
+    seed(repository)
+    table = repository.pending_payments_table(limit=2)
+    assert table.schema.names == storage.PENDING_PAYMENTS_COLUMNS
+    assert table.to_pylist() == repository.pending_payments(limit=2)
+
+
+CHECKS = [check_insert_and_get, check_duplicate_keys, check_find_and_count, check_update_and_delete,
+          check_customer_details, check_pending_payments, check_pending_payments_table]
+
+
+def repository_factories(args):
+    """
+    Yield (name, factory) pairs; each factory returns a fresh, empty repository.
+    """
+    if args.backend in ("all", "sqlite"):
+        yield "sqlite", lambda: storage.SQLiteRepository(":memory:")
+    if args.backend in ("all", "mongod"):
+        client = MongoClient(args.uri, serverSelectionTimeoutMS=1000)
+        try:
+            client.admin.command("ping")
+        except PyMongoError as e:
+            if args.backend == "mongod":
+                raise
+            print(f"mongod: skipped, no server at {args.uri} ({e.__class__.__name__})")
+        else:
+            def fresh_mongo():
+                client.drop_database(args.db)
+                return storage.MongoRepository(client[args.db])
+            yield "mongod", fresh_mongo
+    if args.backend == "mongomock":
+        import mongomock
+        yield "mongomock", lambda: storage.MongoRepository(mongomock.MongoClient()[args.db])
+
+
+def create_indexes(repository):
+    # Unique keys, as the app's ensure_indexes creates them
+    if isinstance(repository, storage.MongoRepository):
+        for collection_name, key_field in storage.ENTITIES.values():
+            repository.db[collection_name].create_index(key_field, unique=True)
+    return repository
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the storage conformance checks against each backend.")
+    parser.add_argument("--backend", choices=["all", "sqlite", "mongod", "mongomock"], default="all")
+    parser.add_argument("--uri", default=os.environ.get("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="vehicle_rental_storage_check")
+    args = parser.parse_args()
+
+    failures = 0
+    for backend, factory in repository_factories(args):
+        for check in CHECKS:
+            try:
+                check(create_indexes(factory()))
+                outcome = "ok"
+            except NotImplementedError as e:
+                outcome = f"unsupported by {backend}: {e}"
+            except Exception:
+                failures += 1
+                outcome = "FAILED\n" + traceback.format_exc()
+            print(f"{backend:<10} {check.__name__:<28} {outcome}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
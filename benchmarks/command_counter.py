@@ -0,0 +1,59 @@
+"""
+Command counting shared by the benchmark scripts.
+"""
+import functools
+import threading
+
+from pymongo import monitoring
+
+# mongomock Collection methods that send one command to a real server
+MONGOMOCK_COMMANDS = [
+    "aggregate", "bulk_write", "count_documents", "create_index", "create_indexes", "delete_many", "delete_one",
+    "distinct", "drop", "estimated_document_count", "find", "find_one", "find_one_and_delete",
+    "find_one_and_replace", "find_one_and_update", "index_information", "insert_many", "insert_one",
+    "list_indexes", "replace_one", "update_many", "update_one",
+]
+
+
+class CommandCounter(monitoring.CommandListener):
+    """
+    Counts the commands a client sends to the server, for comparing round trips.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def count_mongomock_commands(counter):
+    """
+    Count mongomock collection calls on `counter` as the commands they stand for, since
+    mongomock publishes no command events. Calls mongomock makes internally (find_one
+    calls find, for one) are not counted again. A cursor counts once, however many
+    batches a server would return it in.
+    """
+    import mongomock.collection
+
+    nested = threading.local()
+
+    def counted(method):
+        @functools.wraps(method)
+        def call(*args, **kwargs):
+            if getattr(nested, "depth", 0) == 0:
+                counter.started(None)
+            nested.depth = getattr(nested, "depth", 0) + 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                nested.depth -= 1
+        return call
+
+    for name in MONGOMOCK_COMMANDS:
+        setattr(mongomock.collection.Collection, name, counted(getattr(mongomock.collection.Collection, name)))
@@ -0,0 +1,223 @@
+"""
+Seeded synthetic data for benchmarks and load tests.
+
+Creates customers, vehicles, suppliers, rentals, payments and users at realistic volumes.
+Vehicle and customer popularity follow a Zipf-like distribution, so a few vehicles and
+customers account for a large share of the rentals, as they do in production. The same
+seed always produces the same data.
+
+Booking periods are random and may overlap for the same vehicle: the data is meant for
+timing queries, not for exercising the availability rules.
+
+    python benchmarks/generate_data.py --db vehicle_rental_benchmark
+    python benchmarks/generate_data.py --scale 0.01   # 1% of the default volumes
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import schema  # noqa: E402
+
+DEFAULT_SIZES = {"customers": 100_000, "vehicles": 20_000, "rentals": 1_000_000, "payments": 1_000_000}
+BATCH_SIZE = 10_000
+SKEW = 1.0  # Zipf exponent for vehicle and customer popularity
+FIRST_DAY = date(2022, 1, 1)
+DAYS = 3 * 365
+
+FIRST_NAMES = ["Aarav", "Ana", "Ben", "Chen", "Diya", "Elena", "Farah", "Gabriel", "Hana", "Ivan",
+               "Jonas", "Kavya", "Liam", "Maya", "Noah", "Olivia", "Priya", "Ravi", "Sara", "Tom"]
+LAST_NAMES = ["Brown", "Garcia", "Gupta", "Ivanova", "Jensen", "Kim", "Lopez", "Martin", "Nair",
+              "Okafor", "Patel", "Reddy", "Rossi", "Schmidt", "Silva", "Smith", "Tanaka", "Wang"]
+VEHICLE_MODELS = {
+    "car": [("Toyota", "Corolla"), ("Honda", "Civic"), ("Hyundai", "i20"), ("Tata", "Nexon"), ("Ford", "Focus")],
+    "suv": [("Mahindra", "XUV700"), ("Toyota", "Fortuner"), ("Kia", "Seltos"), ("Jeep", "Compass")],
+    "truck": [("Ashok Leyland", "Dost"), ("Tata", "Ace"), ("Volvo", "FH16")],
+    "van": [("Maruti", "Eeco"), ("Ford", "Transit"), ("Mercedes", "Sprinter")],
+    "bike": [("Royal Enfield", "Classic 350"), ("Bajaj", "Pulsar"), ("Honda", "Activa")],
+}
+DAILY_RATES = {"car": 45, "suv": 70, "truck": 110, "van": 80, "bike": 15}
+
+
+def zipf_cumulative_weights(n, skew=SKEW):
+    return list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+def pick(rng, cumulative_weights):
+    """
+    Draw an index with the given cumulative weights; rank 0 is the most popular.
+    """
+    return bisect.bisect(cumulative_weights, rng.random() * cumulative_weights[-1])
+
+
+def insert_batches(collection, documents, batch_size=BATCH_SIZE):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def with_search_keys(collection_name, documents):
+    # Written as the app writes them, so its startup backfill finds nothing to do
+    for document in documents:
+        document["search_keys"] = schema.search_keys(collection_name, document)
+        yield document
+
+
+def customer_id(i):
+    return f"C{i:07d}"
+
+
+def vehicle_id(i):
+    return f"V{i:06d}"
+
+
+def generate_customers(rng, n):
+    for i in range(n):
+        yield {
+            "customer_id": customer_id(i),
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "email": f"customer{i}@example.com",
+            "phone": f"9{rng.randrange(10 ** 9):09d}",
+        }
+
+
+def generate_vehicles(rng, n):
+    for i in range(n):
+        vehicle_type = rng.choice(list(VEHICLE_MODELS))
+        brand, model = rng.choice(VEHICLE_MODELS[vehicle_type])
+        yield {
+            "vehicle_id": vehicle_id(i),
+            "vehicle_name": f"{brand} {model}",
+            "type": vehicle_type,
+            "brand": brand,
+            "availability_status": "Available",
+        }
+
+
+def generate_suppliers(rng, n_vehicles):
+    # One supplier record per vehicle, drawn from a smaller pool of supplier companies
+    companies = [f"Fleet Partner {i}" for i in range(max(1, n_vehicles // 100))]
+    for i in range(n_vehicles):
+        company = rng.choice(companies)
+        yield {
+            "supplier_id": f"S{i:06d}",
+            "supplier_name": company,
+            "contact_info": f"8{rng.randrange(10 ** 9):09d}",
+            "email": f"{company.lower().replace(' ', '.')}@example.com",
+            "vehicle_id": vehicle_id(i),
+        }
+
+
+def generate_rentals_and_payments(rng, n_rentals, n_payments, vehicle_types, n_customers):
+    """
+    Yield (rental, payments) pairs. Every rental gets one payment until n_payments is
+    reached; the remaining payments are spread as second instalments over earlier rentals.
+    """
+    vehicle_weights = zipf_cumulative_weights(len(vehicle_types))
+    customer_weights = zipf_cumulative_weights(n_customers)
+    extra_payments = max(0, n_payments - n_rentals)
+    payment_count = 0
+    for i in range(n_rentals):
+        vehicle = pick(rng, vehicle_weights)
+        customer = customer_id(pick(rng, customer_weights))
+        days = rng.choice([1, 1, 2, 3, 3, 5, 7, 14])
+        start_date = FIRST_DAY + timedelta(days=rng.randrange(DAYS))
+        rental = {
+            "rental_id": f"R{i:08d}",
+            "customer_id": customer,
+            "vehicle_id": vehicle_id(vehicle),
+            "no_of_days_rented": days,
+            "start_date": str(start_date),
+            "end_date": str(start_date + timedelta(days=days)),
+        }
+        instalments = 0
+        if payment_count < n_payments:
+            instalments = 1
+            if extra_payments and rng.random() < extra_payments / (n_rentals - i):
+                instalments = 2
+                extra_payments -= 1
+        amount = DAILY_RATES[vehicle_types[vehicle]] * days
+        payments = []
+        for instalment in range(instalments):
+            payment_count += 1
+            payments.append({
+                "payment_id": f"P{payment_count:08d}",
+                "rental_id": rental["rental_id"],
+                "customer_id": customer,
+                "amount": round(amount / instalments, 2),
+                "payment_date": str(start_date + timedelta(days=instalment * days)),
+                "payment_method": rng.choice(schema.PAYMENT_METHODS),
+                "status": "Pending" if rng.random() < 0.2 else "Paid",
+            })
+        yield rental, payments
+
+
+def generate(db, sizes=None, seed=42, drop=True, progress=print):
+    """
+    Fill db with synthetic data. sizes overrides DEFAULT_SIZES per collection.
+    """
+    sizes = {**DEFAULT_SIZES, **(sizes or {})}
+    rng = random.Random(seed)
+    if drop:
+        # The rollup and summary collections too, or the reports would describe the old data
+        for name in ["Users", "Customers", "Vehicles", "Rentals", "Suppliers", "Payments", "DailyRevenue",
+                     "RollupStatus", "VehicleStats", "CustomerStats", "SupplierStats", "SummaryChanges"]:
+            db[name].drop()
+
+    progress(f"customers: {sizes['customers']}")
+    insert_batches(db["Customers"], with_search_keys("Customers", generate_customers(rng, sizes["customers"])))
+    insert_batches(db["Users"], itertools.chain(
+        [{"username": "admin@example.com", "password": "admin", "role": "admin"}],
+        ({"username": f"customer{i}@example.com", "password": "password", "role": "customer",
+          "email": f"customer{i}@example.com"} for i in range(sizes["customers"])),
+    ))
+
+    progress(f"vehicles and suppliers: {sizes['vehicles']}")
+    vehicles = list(with_search_keys("Vehicles", generate_vehicles(rng, sizes["vehicles"])))
+    insert_batches(db["Vehicles"], vehicles)
+    insert_batches(db["Suppliers"], with_search_keys("Suppliers", generate_suppliers(rng, sizes["vehicles"])))
+
+    progress(f"rentals: {sizes['rentals']}, payments: {sizes['payments']}")
+    vehicle_types = [vehicle["type"] for vehicle in vehicles]
+    rental_batch, payment_batch = [], []
+    for rental, payments in generate_rentals_and_payments(
+            rng, sizes["rentals"], sizes["payments"], vehicle_types, sizes["customers"]):
+        rental_batch.append(rental)
+        payment_batch.extend(payments)
+        if len(rental_batch) >= BATCH_SIZE:
+            db["Rentals"].insert_many(rental_batch, ordered=False)
+            db["Payments"].insert_many(payment_batch, ordered=False)
+            rental_batch, payment_batch = [], []
+    if rental_batch:
+        db["Rentals"].insert_many(rental_batch, ordered=False)
+    if payment_batch:
+        db["Payments"].insert_many(payment_batch, ordered=False)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic data for benchmarks.")
+    parser.add_argument("--uri", default=os.environ.get("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="vehicle_rental_benchmark")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the default volumes")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = {name: max(1, int(size * args.scale)) for name, size in DEFAULT_SIZES.items()}
+    generate(MongoClient(args.uri)[args.db], sizes, args.seed)
+    print("done; the app creates indexes and the daily revenue rollup on first start")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Concurrent-session load test: many simulated admins and customers drive app.py through
+Streamlit's AppTest at once, in one process, the way one server process runs each
+session's reruns on its own script thread.
+
+Admin sessions log in, visit every admin_dashboard section and submit the Add Customer
+form; customer sessions log in, open customer_dashboard and switch its tabs. The report
+gives p50/p95/p99 rerun latency per action, database commands per rerun and memory growth
+per session, against data seeded with generate_data.py (unless --no-seed).
+
+    python benchmarks/load_test.py --admins 4 --customers 32 --rounds 3
+    python benchmarks/load_test.py --no-seed --customers 100 --json load.json
+    python benchmarks/load_test.py --backend mongomock --scale 0.0005   # smoke test of the harness
+
+Commands per rerun are measured in a sequential pass before the concurrent one, so every
+command seen belongs to the single rerun in flight (background jobs aside). AppTest is not
+built for concurrent runs, so the harness shares the process-wide state it swaps on every
+run; see share_apptest_globals. The mongomock backend does not implement every aggregation
+the app uses; the reruns that need one are reported as unsupported there rather than as
+errors, and its commands are counted from its collection calls (see
+command_counter.count_mongomock_commands). The run exits non-zero if any rerun fails.
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import generate_data  # noqa: E402
+from bench_queries import AsyncMongomock  # noqa: E402
+from command_counter import CommandCounter, count_mongomock_commands  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(__file__), "..", "app.py")
+MONGOMOCK_UNSUPPORTED = "not implemented in Mongomock"
+
+
+def rss_bytes():
+    """
+    Current resident set size, or the peak where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def share_apptest_globals():
+    """
+    Let AppTest runs overlap on several threads, as a server's script threads do.
+
+    AppTest assumes one run at a time: each run installs its own Runtime instance and
+    clears it when done, patches the config options and restores them, and compiles the
+    script afresh, and concurrent compiles trip CPython's AST constructor ("recursion
+    depth mismatch"). Like a server process, the runs here share one runtime, one config
+    patch held while any run is in flight, and one compiled script.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    class KeepInstance(type(Runtime)):
+        # Installing a runtime replaces the shared one; clearing it is ignored
+        def __setattr__(cls, name, value):
+            if name != "_instance":
+                super().__setattr__(name, value)
+            elif value is not None:
+                Runtime._instance = value
+
+    class SharedRuntime(Runtime, metaclass=KeepInstance):
+        pass
+
+    lock = threading.Lock()
+    patch = {"runs": 0, "context": None}
+    patch_config_options = app_test.patch_config_options
+
+    @contextlib.contextmanager
+    def shared_patch_config_options(options):
+        with lock:
+            if patch["runs"] == 0:
+                patch["context"] = patch_config_options(options)
+                patch["context"].__enter__()
+            patch["runs"] += 1
+        try:
+            yield
+        finally:
+            with lock:
+                patch["runs"] -= 1
+                if patch["runs"] == 0:
+                    patch["context"].__exit__(None, None, None)
+
+    script_cache = ScriptCache()
+    app_test.Runtime = SharedRuntime
+    app_test.patch_config_options = shared_patch_config_options
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Session:
+    """
+    One simulated browser session. Every rerun is timed and attributed to an action name.
+    """
+    def __init__(self, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.timings = []  # (action, seconds, error, unsupported)
+
+    def rerun(self, action, element=None):
+        start = time.perf_counter()
+        (element or self.app).run()
+        seconds = time.perf_counter() - start
+        messages = [exception.message for exception in self.app.exception]
+        unsupported = any(MONGOMOCK_UNSUPPORTED in message for message in messages)
+        error = "; ".join(message for message in messages if MONGOMOCK_UNSUPPORTED not in message) or None
+        self.timings.append((action, seconds, error, unsupported))
+        return self.app
+
+    def button(self, label):
+        return next(button for button in self.app.button if button.label == label)
+
+    def login(self, username, password):
+        self.rerun("open login page")
+        self.app.text_input(key="login_email").set_value(username)
+        self.app.text_input(key="login_password").set_value(password)
+        self.rerun("log in", self.button("Login").click())
+
+
+def admin_session(session, sections, number, rounds):
+    session.login("admin@example.com", "admin")
+    for round_number in range(rounds):
+        for section in sections:
+            session.rerun(f"section: {section}", session.app.radio(key="admin_section").set_value(section))
+            if section == "Manage Customers":
+                customer_id = f"LOAD-{number}-{round_number}"
+                session.app.text_input(key="customer_id").set_value(customer_id)
+                session.app.text_input(key="name").set_value(f"Load Test {number}")
+                session.app.text_input(key="email").set_value(f"{customer_id.lower()}@example.com")
+                session.app.text_input(key="phone").set_value("9000000000")
+                session.rerun("submit: add customer", session.button("Add Customer").click())
+
+
+def customer_session(session, number, rounds):
+    session.login(f"customer{number}@example.com", "password")
+    for _ in range(rounds):
+        tabs = next(radio for radio in session.app.radio if radio.label == "Select a tab") if session.app.radio else None
+        if tabs is None:
+            session.rerun("customer dashboard")
+            continue
+        for tab in tabs.options:
+            session.rerun(f"customer tab: {tab}", next(radio for radio in session.app.radio if radio.label == "Select a tab").set_value(tab))
+
+
+def run_sessions(jobs, timeout, concurrency):
+    """
+    Run (kind, number) session jobs, `concurrency` at a time, all starting together.
+    Returns the finished sessions; they are kept alive so their state counts towards memory.
+    """
+    barrier = threading.Barrier(min(concurrency, len(jobs)))
+    sessions = []
+
+    def run(job):
+        run_session, args = job
+        session = Session(timeout)
+        sessions.append(session)
+        try:
+            barrier.wait(timeout=60)
+        except threading.BrokenBarrierError:
+            pass
+        try:
+            run_session(session, *args)
+        except Exception as e:  # A failed rerun ends the session; it is reported, not raised
+            session.timings.append(("session aborted", 0.0, f"{e.__class__.__name__}: {e}", False))
+        return session
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, jobs))
+    return sessions
+
+
+def commands_per_action(jobs, timeout, counter):
+    """
+    Run one session of each kind on its own and count the commands each rerun sends.
+    """
+    commands = defaultdict(list)
+    for run_session, args in jobs:
+        session = Session(timeout)
+        original_rerun = session.rerun
+
+        def counted_rerun(action, element=None):
+            counter.count = 0
+            result = original_rerun(action, element)
+            commands[action].append(counter.count)
+            return result
+
+        session.rerun = counted_rerun
+        try:
+            run_session(session, *args)
+        except Exception as e:
+            print(f"{run_session.__name__} aborted: {e.__class__.__name__}: {e}")
+    return {action: round(statistics.mean(counts), 1) for action, counts in commands.items()}
+
+
+def summarize(sessions):
+    by_action = defaultdict(list)
+    errors = defaultdict(int)
+    unsupported = defaultdict(int)
+    first_errors = {}
+    for session in sessions:
+        for action, seconds, error, stand_in_gap in session.timings:
+            by_action[action].append(seconds)
+            unsupported[action] += stand_in_gap
+            if error:
+                errors[action] += 1
+                first_errors.setdefault(action, error)
+
+    def stats(values):
+        values = sorted(values)
+        return {
+            "reruns": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+        }
+
+    summary = {action: {**stats(values), "errors": errors[action], "unsupported": unsupported[action]}
+               for action, values in sorted(by_action.items())}
+    summary["all reruns"] = {**stats([seconds for values in by_action.values() for seconds in values]),
+                             "errors": sum(errors.values()), "unsupported": sum(unsupported.values())}
+    return summary, first_errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive many concurrent app sessions and report rerun latency.")
+    parser.add_argument("--backend", choices=["mongod", "mongomock"], default="mongod")
+    parser.add_argument("--uri", default=os.environ.get("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="vehicle_rental_benchmark")
+    parser.add_argument("--scale", type=float, default=0.01, help="fraction of generate_data's default volumes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data already in --db")
+    parser.add_argument("--admins", type=int, default=4)
+    parser.add_argument("--customers", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=2, help="times each session repeats its actions")
+    parser.add_argument("--concurrency", type=int, default=0, help="sessions running at once (default: all)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds before a rerun counts as hung")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # The app reads its connection settings when imported, and the listener must be
+    # registered before the app creates its client
+    os.environ["MONGODB_URI"] = args.uri
+    os.environ["MONGODB_DB"] = args.db
+    counter = CommandCounter()
+    monitoring.register(counter)
+    if args.backend == "mongomock":
+        import mongomock
+        import pymongo
+
+        count_mongomock_commands(counter)
+        shared_client = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *a, **kw: shared_client
+        pymongo.AsyncMongoClient = lambda *a, **kw: AsyncMongomock(shared_client)
+    import app
+
+    sizes = {name: max(1, int(size * args.scale)) for name, size in generate_data.DEFAULT_SIZES.items()}
+    if not args.no_seed:
+        generate_data.generate(app.db, sizes, args.seed)
+    args.customers = min(args.customers, app.customers.estimated_document_count())
+
+    sections = list(app.ADMIN_SECTIONS)
+    jobs = ([(admin_session, (sections, number, args.rounds)) for number in range(args.admins)]
+            + [(customer_session, (number, args.rounds)) for number in range(args.customers)])
+
+    # Sequential pass: warms the per-process caches and counts commands per rerun
+    print("measuring commands per rerun, one session at a time")
+    commands = commands_per_action([(admin_session, (sections, "calibration", 1))]
+                                   + [(customer_session, (0, 1))], args.timeout, counter)
+
+    print(f"running {args.admins} admin and {args.customers} customer sessions")
+    share_apptest_globals()
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    sessions = run_sessions(jobs, args.timeout, args.concurrency or len(jobs))
+    wall_seconds = time.perf_counter() - start
+    rss_after = rss_bytes()
+    summary, first_errors = summarize(sessions)
+
+    print(f"\n{'action':<40} {'reruns':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7} "
+          f"{'unsupp.':>7} {'commands':>9}")
+    for action, row in summary.items():
+        print(f"{action:<40} {row['reruns']:>7} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} "
+              f"{row['max_ms']:>9} {row['errors']:>7} {row['unsupported']:>7} {commands.get(action, ''):>9}")
+    reruns = summary["all reruns"]["reruns"]
+    memory_per_session = (rss_after - rss_before) / max(1, len(sessions))
+    print(f"\n{reruns} reruns in {wall_seconds:.1f}s ({reruns / wall_seconds:.1f} reruns/s)")
+    print(f"memory: {rss_before / 1e6:.0f} MB before, {rss_after / 1e6:.0f} MB after, "
+          f"{memory_per_session / 1e3:.0f} KB per session")
+    for action, error in first_errors.items():
+        print(f"first error in '{action}': {error}")
+
+    if args.json:
+        with open(args.json, "w") as results_file:
+            json.dump({
+                "backend": args.backend, "scale": args.scale, "admins": args.admins, "customers": args.customers,
+                "rounds": args.rounds, "wall_seconds": round(wall_seconds, 2), "latency": summary,
+                "commands_per_rerun": commands, "rss_before": rss_before, "rss_after": rss_after,
+                "memory_per_session": round(memory_per_session),
+            }, results_file, indent=2)
+    return 1 if summary["all reruns"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+The booking lease on vehicles, shared by the admin booking form and bulk import.
+
+A vehicle is claimed by setting its booking_lock to {token, expires_at}, with an update
+that only matches while the vehicle is in service and no unexpired lock is held, so
+concurrent bookings of one vehicle are serialised wherever they come from. Contended
+claims are retried up to MAX_ATTEMPTS times with jittered exponential backoff. The lock
+expires after LOCK_SECONDS, so a crashed holder does not block the vehicle for good.
+Releasing the lock can mark the vehicle Unavailable in the same update, when a booking
+written under it covers today.
+
+Refusal reasons: "missing", "out of service" or "busy" (held by another admin).
+"""
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+LOCK_SECONDS = float(os.environ.get("BOOKING_LOCK_SECONDS", "10"))
+MAX_ATTEMPTS = int(os.environ.get("BOOKING_MAX_ATTEMPTS", "5"))
+
+
+def _claimable(now):
+    return {"out_of_service": {"$ne": True},
+            "$or": [{"booking_lock": None}, {"booking_lock.expires_at": {"$lt": now}}]}
+
+
+def _lock(token, now):
+    return {"$set": {"booking_lock": {"token": token, "expires_at": now + timedelta(seconds=LOCK_SECONDS)}}}
+
+
+def _backoff(attempt):
+    time.sleep(random.uniform(0.5, 1.0) * 0.05 * 2 ** attempt)
+
+
+def claim_vehicle(db, vehicle_id):
+    """
+    Claim one vehicle with a conditional find_one_and_update. Returns the lock token, or
+    None with the refusal reason.
+    """
+    token = os.urandom(8).hex()
+    for attempt in range(MAX_ATTEMPTS):
+        now = datetime.now(timezone.utc)
+        if db["Vehicles"].find_one_and_update({"vehicle_id": vehicle_id, **_claimable(now)}, _lock(token, now),
+                                              projection={"_id": 1}):
+            return token, None
+        # The claim failed, so read why
+        vehicle = db["Vehicles"].find_one({"vehicle_id": vehicle_id}, {"_id": 0, "out_of_service": 1})
+        if not vehicle:
+            return None, "missing"
+        if vehicle.get("out_of_service"):
+            return None, "out of service"
+        _backoff(attempt)
+    return None, "busy"
+
+
+def claim_vehicles(db, vehicle_ids):
+    """
+    Claim several vehicles with one update_many per attempt, retrying those held by another
+    admin. Returns the lock token, the claimed vehicle IDs and a map of refused vehicle
+    IDs to their reason.
+    """
+    token = os.urandom(8).hex()
+    claimed, refused, waiting = set(), {}, set(vehicle_ids)
+    for attempt in range(MAX_ATTEMPTS):
+        if not waiting:
+            break
+        if attempt:
+            _backoff(attempt)
+        now = datetime.now(timezone.utc)
+        db["Vehicles"].update_many({"vehicle_id": {"$in": list(waiting)}, **_claimable(now)}, _lock(token, now))
+        found = set()
+        for vehicle in db["Vehicles"].find({"vehicle_id": {"$in": list(waiting)}},
+                                           {"_id": 0, "vehicle_id": 1, "out_of_service": 1, "booking_lock.token": 1}):
+            found.add(vehicle["vehicle_id"])
+            if vehicle.get("booking_lock", {}).get("token") == token:
+                claimed.add(vehicle["vehicle_id"])
+            elif vehicle.get("out_of_service"):
+                refused[vehicle["vehicle_id"]] = "out of service"
+        refused.update({vehicle_id: "missing" for vehicle_id in waiting - found})
+        waiting -= claimed | set(refused)
+    refused.update({vehicle_id: "busy" for vehicle_id in waiting})
+    return token, claimed, refused
+
+
+def release_vehicles(db, vehicle_ids, token, unavailable=()):
+    """
+    Release the lock this token holds on the given vehicles, marking those in `unavailable`
+    Unavailable in the same update. Sends one update per group that is not empty.
+    """
+    vehicle_ids, unavailable = set(vehicle_ids), set(unavailable)
+    release = {"$unset": {"booking_lock": ""}}
+    if busy := vehicle_ids & unavailable:
+        db["Vehicles"].update_many({"vehicle_id": {"$in": list(busy)}, "booking_lock.token": token},
+                                   {**release, "$set": {"availability_status": "Unavailable"}})
+    if free := vehicle_ids - unavailable:
+        db["Vehicles"].update_many({"vehicle_id": {"$in": list(free)}, "booking_lock.token": token}, release)
@@ -0,0 +1,363 @@
+"""
+Bulk import of customers, vehicles, rentals and payments from CSV or Parquet files.
+
+Rows are streamed in chunks. Each chunk is validated with the same rules as the admin
+forms, its references are checked with one batched $in query per referenced collection,
+and the valid rows are written with a single unordered insert_many. Dated rentals are
+written while holding the booking lease of their vehicles, the same lease the admin form
+takes, so an import and an interactive booking cannot book one vehicle twice.
+
+    python bulk_import.py vehicles fleet.parquet
+    python bulk_import.py payments payments.csv --chunk-size 10000
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+
+import analytics
+import booking
+import schema
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+# How bulk import reports the booking module's refusal reasons
+REFUSALS = {"missing": "missing from Vehicles", "out of service": "out of service",
+            "busy": "being booked by another admin"}
+
+# Collection, unique key and required fields of every importable entity
+ENTITIES = {
+    "customers": ("Customers", "customer_id", ["customer_id", "name", "email", "phone"]),
+    "vehicles": ("Vehicles", "vehicle_id", ["vehicle_id", "vehicle_name", "type", "brand"]),
+    "rentals": ("Rentals", "rental_id", ["rental_id", "customer_id", "vehicle_id", "no_of_days_rented"]),
+    "payments": ("Payments", "payment_id", ["payment_id", "rental_id", "customer_id", "amount", "payment_date"]),
+}
+
+OUT_OF_SERVICE_VALUES = {"true": True, "yes": True, "1": True, "false": False, "no": False, "0": False}
+
+# Referential integrity checks: field -> (collection, key) it must exist in
+REFERENCES = {
+    "rentals": {"customer_id": ("Customers", "customer_id"), "vehicle_id": ("Vehicles", "vehicle_id")},
+    "payments": {"customer_id": ("Customers", "customer_id"), "rental_id": ("Rentals", "rental_id")},
+}
+
+
+def read_rows(file, file_name, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield lists of row dicts from a CSV or Parquet file without loading the whole file.
+    """
+    if file_name.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq  # Optional dependency, only needed for Parquet files
+
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as binary_file:
+            yield from read_rows(binary_file, file_name, chunk_size)
+        return
+
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def clean_row(entity, row):
+    """
+    Validate one row and convert it to the document the admin form would insert.
+    Raises ValueError with a readable message for invalid rows.
+    """
+    _, _, required = ENTITIES[entity]
+    missing = [field for field in required if not _text(row.get(field))]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    if entity == "customers":
+        document = {field: _text(row[field]) for field in required}
+        document["search_keys"] = schema.search_keys("Customers", document)
+        return document
+
+    if entity == "vehicles":
+        # Availability is derived from the bookings and the service status, never imported
+        if _text(row.get("availability_status")):
+            raise ValueError("availability_status is derived from bookings; set out_of_service instead")
+        out_of_service = _text(row.get("out_of_service")).lower() or "false"
+        if out_of_service not in OUT_OF_SERVICE_VALUES:
+            raise ValueError(f"Invalid out_of_service '{row['out_of_service']}'")
+        document = {field: _text(row[field]) for field in required}
+        document["out_of_service"] = OUT_OF_SERVICE_VALUES[out_of_service]
+        # As for a vehicle added in the form; the app refreshes it from the bookings after the import
+        document["availability_status"] = "Unavailable" if document["out_of_service"] else "Available"
+        document["search_keys"] = schema.search_keys("Vehicles", document)
+        return document
+
+    if entity == "rentals":
+        try:
+            days = int(float(row["no_of_days_rented"]))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid no_of_days_rented '{row['no_of_days_rented']}'")
+        if days < 1:
+            raise ValueError("no_of_days_rented must be at least 1")
+        document = {
+            "rental_id": _text(row["rental_id"]),
+            "customer_id": _text(row["customer_id"]),
+            "vehicle_id": _text(row["vehicle_id"]),
+            "no_of_days_rented": days,
+        }
+        # Optional booking period, end_date is exclusive like the admin form
+        if _text(row.get("start_date")):
+            try:
+                start_date = datetime.fromisoformat(_text(row["start_date"])).date()
+            except ValueError:
+                raise ValueError(f"Invalid start_date '{row['start_date']}'")
+            document["start_date"] = str(start_date)
+            document["end_date"] = str(start_date + timedelta(days=days))
+        return document
+
+    if entity == "payments":
+        try:
+            amount = float(row["amount"])
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid amount '{row['amount']}'")
+        if amount < 0:
+            raise ValueError("amount must not be negative")
+        try:
+            payment_date = datetime.fromisoformat(_text(row["payment_date"])).date()
+        except ValueError:
+            raise ValueError(f"Invalid payment_date '{row['payment_date']}'")
+        method = _text(row.get("payment_method")) or "Cash"
+        if method not in schema.PAYMENT_METHODS:
+            raise ValueError(f"Invalid payment_method '{method}'")
+        status = _text(row.get("status")) or "Pending"
+        if status not in schema.PAYMENT_STATUSES:
+            raise ValueError(f"Invalid status '{status}'")
+        return {
+            "payment_id": _text(row["payment_id"]),
+            "rental_id": _text(row["rental_id"]),
+            "customer_id": _text(row["customer_id"]),
+            "amount": amount,
+            "payment_date": str(payment_date),
+            "payment_method": method,
+            "status": status,
+        }
+
+    raise ValueError(f"Unknown entity '{entity}'")
+
+
+def existing_keys(db, collection_name, key, values):
+    """
+    Return the subset of values present in collection.key, in one $in query.
+    """
+    cursor = db[collection_name].find({key: {"$in": list(values)}}, {"_id": 0, key: 1})
+    return {document[key] for document in cursor}
+
+
+def import_chunk(db, entity, rows, first_row_number, report):
+    """
+    Validate and insert one chunk of rows, recording per-row errors in the report.
+    Returns the documents that were inserted.
+    """
+    collection_name, _, _ = ENTITIES[entity]
+    documents, row_numbers = [], []
+    for offset, row in enumerate(rows):
+        try:
+            documents.append(clean_row(entity, row))
+            row_numbers.append(first_row_number + offset)
+        except ValueError as e:
+            add_error(report, first_row_number + offset, str(e))
+
+    # Referential integrity, one batched lookup per referenced collection
+    for field, (ref_collection, ref_key) in REFERENCES.get(entity, {}).items():
+        found = existing_keys(db, ref_collection, ref_key, {document[field] for document in documents})
+        valid_documents, valid_numbers = [], []
+        for document, row_number in zip(documents, row_numbers):
+            if document[field] in found:
+                valid_documents.append(document)
+                valid_numbers.append(row_number)
+            else:
+                add_error(report, row_number, f"{field} '{document[field]}' does not exist in {ref_collection}")
+        documents, row_numbers = valid_documents, valid_numbers
+
+    if entity == "rentals":
+        return import_rentals(db, documents, row_numbers, report)
+    return insert_documents(db, collection_name, documents, row_numbers, report)
+
+
+def insert_documents(db, collection_name, documents, row_numbers, report):
+    """
+    Insert documents with one unordered insert_many, recording the rows that fail.
+    Returns the documents that were inserted.
+    """
+    if not documents:
+        return []
+
+    # Unordered insert: duplicates rejected by the unique index don't stop the rest of the chunk
+    failed = set()
+    try:
+        db[collection_name].insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details["writeErrors"]:
+            failed.add(error["index"])
+            message = "Duplicate key" if error["code"] == 11000 else error["errmsg"]
+            add_error(report, row_numbers[error["index"]], message)
+
+    inserted = [document for index, document in enumerate(documents) if index not in failed]
+    report["inserted"] += len(inserted)
+    return inserted
+
+
+def _overlapping(intervals, document):
+    return next((booking for booking in intervals
+                 if booking["start_date"] < document["end_date"] and booking["end_date"] > document["start_date"]), None)
+
+
+def import_rentals(db, documents, row_numbers, report):
+    """
+    Insert rentals, rejecting those that overlap a booking of the same vehicle. Dated rows
+    are checked and written while holding their vehicles' booking lease. A row overlapping
+    another row of the chunk waits for a later round, so it is only rejected if that row was
+    actually inserted, and not when the other row failed (e.g. on a duplicate key).
+    """
+    dated_vehicles = {document["vehicle_id"] for document in documents if "start_date" in document}
+    token, claimed, refused = booking.claim_vehicles(db, dated_vehicles)
+    inserted = []
+    try:
+        pending = []
+        for document, row_number in zip(documents, row_numbers):
+            if "start_date" in document and document["vehicle_id"] in refused:
+                add_error(report, row_number, f"vehicle_id '{document['vehicle_id']}' is {REFUSALS[refused[document['vehicle_id']]]}")
+            else:
+                pending.append((document, row_number))
+
+        booked = existing_bookings(db, [document for document, _ in pending if "start_date" in document])
+        while pending:
+            # Each round takes the rows that overlap no other row of the round
+            batch, deferred, round_intervals = [], [], {}
+            for document, row_number in pending:
+                if "start_date" in document:
+                    if conflict := _overlapping(booked.get(document["vehicle_id"], []), document):
+                        add_error(report, row_number, f"vehicle_id '{document['vehicle_id']}' is already booked by rental '{conflict['rental_id']}'")
+                        continue
+                    intervals = round_intervals.setdefault(document["vehicle_id"], [])
+                    if _overlapping(intervals, document):
+                        deferred.append((document, row_number))
+                        continue
+                    intervals.append(document)
+                batch.append((document, row_number))
+            round_inserted = insert_documents(db, "Rentals", [document for document, _ in batch],
+                                              [row_number for _, row_number in batch], report)
+            for document in round_inserted:
+                if "start_date" in document:
+                    booked.setdefault(document["vehicle_id"], []).append(document)
+            inserted += round_inserted
+            pending = deferred
+    finally:
+        release_vehicles(db, claimed, token, inserted)
+    return inserted
+
+
+def existing_bookings(db, dated):
+    """
+    Map vehicle IDs to their bookings overlapping the span of the given dated rentals, in one query.
+    """
+    booked = {}
+    if not dated:
+        return booked
+    for rental in db["Rentals"].find({
+        "vehicle_id": {"$in": list({document["vehicle_id"] for document in dated})},
+        "end_date": {"$gt": min(document["start_date"] for document in dated)},
+        "start_date": {"$lt": max(document["end_date"] for document in dated)},
+    }, {"_id": 0, "vehicle_id": 1, "start_date": 1, "end_date": 1, "rental_id": 1}):
+        booked.setdefault(rental["vehicle_id"], []).append(rental)
+    return booked
+
+
+def release_vehicles(db, vehicle_ids, token, inserted):
+    """
+    Release the lease on the claimed vehicles, marking those whose new bookings cover today
+    Unavailable in the same update, as the app does when it releases a booking.
+    """
+    today = str(date.today())
+    booking.release_vehicles(db, vehicle_ids, token, {
+        document["vehicle_id"] for document in inserted
+        if "start_date" in document and document["start_date"] <= today < document["end_date"]
+    })
+
+
+def add_error(report, row_number, message):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": row_number, "error": message})
+
+
+def import_file(db, entity, file, file_name, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Stream a CSV or Parquet file into the entity's collection.
+    Returns a report with the row, inserted and failed counts, per-row errors and throughput.
+    """
+    if entity not in ENTITIES:
+        raise ValueError(f"Unknown entity '{entity}', expected one of {', '.join(ENTITIES)}")
+
+    report = {"rows": 0, "inserted": 0, "failed": 0, "errors": [], "seconds": 0.0, "rows_per_second": 0.0}
+    start = time.perf_counter()
+    for rows in read_rows(file, file_name, chunk_size):
+        # Row numbers are 1-based data rows, not counting the CSV header
+        inserted = import_chunk(db, entity, rows, report["rows"] + 1, report)
+        if entity == "rentals":
+            analytics.record_rentals(db, inserted)
+        if entity == "payments":
+            analytics.record_payments_revenue(db, inserted)
+            analytics.record_payments(db, inserted)
+        report["rows"] += len(rows)
+        if progress:
+            progress(report)
+
+    report["errors"].sort(key=lambda error: error["row"])
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    if report["seconds"]:
+        report["rows_per_second"] = round(report["rows"] / report["seconds"], 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import CSV or Parquet files into the vehicle rental database.")
+    parser.add_argument("entity", choices=list(ENTITIES))
+    parser.add_argument("path", help="CSV or Parquet file to import")
+    parser.add_argument("--uri", default=os.environ.get("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default=os.environ.get("MONGODB_DB", "vehicle_rental_system"))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)[args.db]
+
+    def progress(report):
+        print(f"\r{report['rows']} rows, {report['inserted']} inserted, {report['failed']} failed", end="", file=sys.stderr)
+
+    report = import_file(db, args.entity, args.path, args.path, args.chunk_size, progress)
+    print(file=sys.stderr)
+    for error in report["errors"]:
+        print(f"row {error['row']}: {error['error']}")
+    print(f"{report['rows']} rows, {report['inserted']} inserted, {report['failed']} failed "
+          f"in {report['seconds']}s ({report['rows_per_second']} rows/s)")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
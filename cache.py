@@ -0,0 +1,102 @@
+"""
+In-process read-through cache for reference data, shared by the sessions of one server process.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe read-through cache with LRU eviction and a per-entry time to live.
+    Keys are tuples whose first element is a namespace (e.g. "vehicles") so a write
+    can invalidate everything read from one collection. Entries that read several
+    collections list them all in `namespaces`. A loaded value is not stored if one of
+    its namespaces was invalidated while it loaded, since it may predate the write, and
+    None (a missing document) is never stored, so a later insert is seen at once.
+    """
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.versions = {}
+
+    def _lookup(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, copy.deepcopy(entry[1])
+            self.misses += 1
+            return False, None
+
+    def _store(self, key, value, namespaces, versions, now):
+        with self._lock:
+            if value is None or self._versions(namespaces) != versions:
+                return copy.deepcopy(value)
+            self._entries[key] = (now + self.ttl_seconds, value, namespaces)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return copy.deepcopy(value)
+
+    def get_or_load(self, key, loader, namespaces=None):
+        now = time.monotonic()
+        found, value = self._lookup(key, now)
+        if found:
+            return value
+        namespaces = namespaces or (key[0],)
+        versions = self.data_version(*namespaces)
+        return self._store(key, loader(), namespaces, versions, now)
+
+    async def get_or_load_async(self, key, loader, namespaces=None):
+        """
+        Same as get_or_load for a loader returning a coroutine, for use with run_concurrently.
+        """
+        now = time.monotonic()
+        found, value = self._lookup(key, now)
+        if found:
+            return value
+        namespaces = namespaces or (key[0],)
+        versions = self.data_version(*namespaces)
+        return self._store(key, await loader(), namespaces, versions, now)
+
+    def invalidate(self, namespace):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if namespace in entry[2]]:
+                del self._entries[key]
+            self.invalidations += 1
+            self.versions[namespace] = self.versions.get(namespace, 0) + 1
+
+    def data_version(self, *namespaces):
+        """
+        Version stamp for the given namespaces; it changes whenever one of them is invalidated.
+        """
+        with self._lock:
+            return self._versions(namespaces)
+
+    def _versions(self, namespaces):
+        # Called with the lock held
+        return tuple(self.versions.get(namespace, 0) for namespace in namespaces)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
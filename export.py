@@ -0,0 +1,165 @@
+"""
+Streaming CSV and XLSX export of payments, rentals and the pending payments report.
+
+Rows are read from a batched cursor sorted by an indexed date field and written one at a
+time, so memory stays flat however many rows are exported: the CSV writer writes through
+to the file, and openpyxl's write-only workbook spools each sheet to disk as it goes.
+The app's downloads are built in memory with export_to_bytes on its report job runner,
+capped at a number of rows; exports of any size are for this command line tool.
+
+    python export.py payments payments.csv --start 2024-01-01 --end 2024-03-31 --status Paid
+    python export.py pending_payments pending.xlsx
+    python export.py rentals - > rentals.csv
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+from datetime import date, timedelta
+
+from openpyxl import Workbook
+from pymongo import ASCENDING, MongoClient
+
+from storage import PENDING_PAYMENTS_COLUMNS, pending_payments_pipeline
+
+BATCH_SIZE = 5000
+XLSX_MAX_ROWS = 1_048_575  # Excel's sheet limit, less the header row; longer exports continue on a new sheet
+
+# Source collection, date field filtered and sorted on, columns, and whether status can be filtered
+EXPORTS = {
+    "payments": ("Payments", "payment_date",
+                 ["payment_id", "rental_id", "customer_id", "amount", "payment_date", "payment_method", "status"], True),
+    "rentals": ("Rentals", "start_date",
+                ["rental_id", "customer_id", "vehicle_id", "start_date", "end_date", "no_of_days_rented"], False),
+    "pending_payments": ("Payments", "payment_date", PENDING_PAYMENTS_COLUMNS, False),
+}
+FORMATS = {"CSV": "csv", "XLSX": "xlsx"}
+
+
+def export_filter(kind, start_date=None, end_date=None, status=None):
+    """
+    Build the filter for a date range (inclusive, either end optional) and a status.
+    Dates are stored as strings that may carry a time, so the end bound is the next day.
+    """
+    _, date_field, _, has_status = EXPORTS[kind]
+    query = {}
+    if start_date or end_date:
+        query[date_field] = {}
+        if start_date:
+            query[date_field]["$gte"] = str(start_date)
+        if end_date:
+            query[date_field]["$lt"] = str(end_date + timedelta(days=1))
+    if status and has_status:
+        query["status"] = status
+    return query
+
+
+def iter_rows(db, kind, start_date=None, end_date=None, status=None, batch_size=BATCH_SIZE):
+    """
+    Yield the rows of an export as dicts, oldest first, fetched batch_size at a time.
+    """
+    collection_name, date_field, columns, _ = EXPORTS[kind]
+    query = export_filter(kind, start_date, end_date, status)
+    if kind == "pending_payments":
+        return db[collection_name].aggregate(pending_payments_pipeline(query, newest_first=False),
+                                             batchSize=batch_size, allowDiskUse=True)
+    projection = {"_id": 0, **{column: 1 for column in columns}}
+    return db[collection_name].find(query, projection, batch_size=batch_size).sort(date_field, ASCENDING)
+
+
+def write_csv(rows, columns, file):
+    """
+    Write rows to a text file opened with newline="". Returns the number of rows written.
+    """
+    writer = csv.writer(file)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([row.get(column, "") for column in columns])
+        count += 1
+    return count
+
+
+def write_xlsx(rows, columns, file, sheet_title="Export"):
+    """
+    Write rows to an XLSX file path or binary file. Returns the number of rows written.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = None
+    count = 0
+    for row in rows:
+        if count % XLSX_MAX_ROWS == 0:
+            sheet = workbook.create_sheet(f"{sheet_title} {count // XLSX_MAX_ROWS + 1}")
+            sheet.append(columns)
+        sheet.append([row.get(column) for column in columns])
+        count += 1
+    if sheet is None:
+        workbook.create_sheet(f"{sheet_title} 1").append(columns)
+    workbook.save(file)
+    return count
+
+
+def export_to_file(db, kind, file_format, path, start_date=None, end_date=None, status=None):
+    """
+    Export to a file path in "CSV" or "XLSX" format. Returns the number of rows written.
+    """
+    columns = EXPORTS[kind][2]
+    rows = iter_rows(db, kind, start_date, end_date, status)
+    if file_format == "XLSX":
+        return write_xlsx(rows, columns, path, kind.replace("_", " ").title())
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        return write_csv(rows, columns, file)
+
+
+def export_to_bytes(db, kind, file_format, start_date=None, end_date=None, status=None, max_rows=None):
+    """
+    Export into memory, stopping after max_rows rows.
+    Returns (file contents, rows written, whether rows were left out by the cap).
+    """
+    columns = EXPORTS[kind][2]
+    truncated = []
+
+    def capped(rows):
+        with rows:  # Closes the cursor when the cap stops the export early
+            for count, row in enumerate(rows):
+                if max_rows is not None and count == max_rows:
+                    truncated.append(True)
+                    return
+                yield row
+
+    rows = capped(iter_rows(db, kind, start_date, end_date, status))
+    buffer = io.BytesIO()
+    if file_format == "XLSX":
+        count = write_xlsx(rows, columns, buffer, kind.replace("_", " ").title())
+    else:
+        text = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+        count = write_csv(rows, columns, text)
+        text.flush()
+        text.detach()
+    return buffer.getvalue(), count, bool(truncated)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export payments, rentals or the pending payments report.")
+    parser.add_argument("kind", choices=list(EXPORTS))
+    parser.add_argument("path", help="output .csv or .xlsx file, or - for CSV on stdout")
+    parser.add_argument("--start", type=date.fromisoformat, help="first date, YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, help="last date, YYYY-MM-DD")
+    parser.add_argument("--status", choices=["Paid", "Pending"], help="payments only")
+    parser.add_argument("--uri", default=os.environ.get("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default=os.environ.get("MONGODB_DB", "vehicle_rental_system"))
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)[args.db]
+    if args.path == "-":
+        count = write_csv(iter_rows(db, args.kind, args.start, args.end, args.status), EXPORTS[args.kind][2], sys.stdout)
+    else:
+        file_format = "XLSX" if args.path.lower().endswith(".xlsx") else "CSV"
+        count = export_to_file(db, args.kind, file_format, args.path, args.start, args.end, args.status)
+    print(f"{count} rows exported", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+pymongo event listeners behind the admin sidebar: connection pool counters and the
+per-rerun query profiler.
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+from pymongo import monitoring
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """
+    Connection pool counters for capacity planning, updated from pymongo's pool events.
+    """
+    def __init__(self, max_pool_size):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self.stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "in_use": 0,
+            "max_in_use": 0,
+            "pool_clears": 0,
+        }
+
+    def _add(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+            self.stats["max_in_use"] = max(self.stats["max_in_use"], self.stats["in_use"])
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self.stats)
+        snapshot["open"] = snapshot["connections_created"] - snapshot["connections_closed"]
+        snapshot["max_pool_size"] = self.max_pool_size
+        return snapshot
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add("pool_clears")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._add("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._add("checkouts")
+        self._add("in_use")
+
+    def connection_checked_in(self, event):
+        self._add("in_use", -1)
+
+
+def query_shape(value):
+    """
+    Replace the literal values of a filter or pipeline with "?", keeping field names and
+    operators, so the same query with different arguments has the same shape.
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [query_shape(item) for item in value]
+    return "?"
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """
+    Records the commands sent during a Streamlit rerun from pymongo's command events.
+    Each script run executes on its own thread and pymongo publishes the events on the
+    thread that issued the command, so the recording lives in a context variable and
+    costs nothing for reruns that are not being profiled. Queries run on the async
+    client join the recording of the rerun that started them (see run_concurrently).
+    Commands are attributed to functions defined in source_files, the app's own modules,
+    so frames of pymongo, Streamlit or anything else installed under the app's directory
+    (e.g. a .venv) are skipped.
+    """
+    # Skipped when naming the function a command came from
+    PLUMBING_FUNCTIONS = {"main", "run_app", "admin_dashboard", "get_or_load", "get_or_load_async", "run_concurrently"}
+
+    def __init__(self, source_files):
+        self.source_files = {os.path.realpath(path) for path in source_files}
+        self._is_source = {}  # co_filename -> whether it is one of source_files
+        self._run = contextvars.ContextVar("query_profiler_run", default=None)
+
+    def start_run(self):
+        self._run.set({"records": [], "pending": {}, "caller": ""})
+
+    def end_run(self):
+        run = self._run.get()
+        self._run.set(None)
+        return run["records"] if run else []
+
+    def current_run(self):
+        """
+        The recording of this rerun, tagged with the calling functions, to attach() on
+        the event loop thread. None when the rerun is not profiled.
+        """
+        run = self._run.get()
+        return run and {**run, "caller": self._origin()}
+
+    def attach(self, run):
+        self._run.set(run)
+
+    def _origin(self):
+        # Application functions on the stack, outermost first, e.g. "view_pending_payments > fetch_pending_payments"
+        names = []
+        frame = sys._getframe(2)
+        while frame:
+            code = frame.f_code
+            is_source = self._is_source.get(code.co_filename)
+            if is_source is None:
+                is_source = self._is_source[code.co_filename] = os.path.realpath(code.co_filename) in self.source_files
+            if (is_source and not code.co_name.startswith("<")
+                    and code.co_name not in self.PLUMBING_FUNCTIONS):
+                names.append(code.co_name)
+            frame = frame.f_back
+        return " > ".join(reversed(names))
+
+    def started(self, event):
+        run = self._run.get()
+        if run is None:
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        if event.command_name in ("find", "count", "distinct", "findAndModify"):
+            query = command.get("filter", command.get("query", {}))
+        elif event.command_name == "aggregate":
+            query = command.get("pipeline", [])
+        elif event.command_name in ("update", "delete"):
+            query = [statement.get("q", {}) for statement in command.get(event.command_name + "s", [])[:1]]
+        else:
+            query = {}
+        run["pending"][(event.connection_id, event.request_id)] = {
+            "command": event.command_name,
+            "collection": collection if isinstance(collection, str) else None,
+            "shape": json.dumps(query_shape(query), sort_keys=True),
+            "function": " > ".join(name for name in (run["caller"], self._origin()) if name),
+            "started_at": datetime.now().isoformat(timespec="milliseconds"),
+        }
+
+    def _finish(self, event, documents=None, error=None):
+        run = self._run.get()
+        record = run["pending"].pop((event.connection_id, event.request_id), None) if run else None
+        if record is None:
+            return
+        record["duration_ms"] = round(event.duration_micros / 1000, 2)
+        record["documents"] = documents
+        record["error"] = error
+        run["records"].append(record)
+
+    def succeeded(self, event):
+        reply = event.reply
+        if "cursor" in reply:
+            documents = len(reply["cursor"].get("firstBatch", reply["cursor"].get("nextBatch", [])))
+        elif "value" in reply:
+            documents = 0 if reply["value"] is None else 1
+        else:
+            documents = reply.get("n")
+        self._finish(event, documents=documents)
+
+    def failed(self, event):
+        self._finish(event, error=str(event.failure.get("errmsg", event.failure)))
+
+
+def query_profile_warnings(records, slow_ms, repeat_threshold):
+    """
+    Suspected N+1 patterns (the same query shape from the same function repeated at least
+    repeat_threshold times within one rerun) and queries taking at least slow_ms.
+    """
+    warnings = []
+    repeats = {}
+    for record in records:
+        key = (record["function"], record["command"], record["collection"], record["shape"])
+        repeats[key] = repeats.get(key, 0) + 1
+    for (function, command, collection, shape), count in repeats.items():
+        if count >= repeat_threshold and command != "getMore":
+            warnings.append(f"Possible N+1: {command} on {collection} ran {count} times from {function or 'module'} with shape {shape}")
+    for record in records:
+        if record["duration_ms"] >= slow_ms:
+            warnings.append(f"Slow: {record['command']} on {record['collection']} took {record['duration_ms']} ms in {record['function'] or 'module'}")
+    return warnings
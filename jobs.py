@@ -0,0 +1,128 @@
+"""
+Background runner for heavy reports, shared by the sessions of one server process.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobRunner:
+    """
+    Runs report jobs on a thread pool and keeps the last good result of each job key
+    with the data version it was computed for. Requests for a version that is already
+    running join it, and a request for a newer version while an older one runs is
+    queued behind it, so each key runs at most one job at a time. Results older than
+    max_age_seconds are recomputed, which picks up writes made by other processes.
+    """
+    def __init__(self, max_workers, max_age_seconds, max_results):
+        self.max_age_seconds = max_age_seconds
+        self.max_results = max_results
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._lock = threading.Lock()
+        self._results = OrderedDict()  # key -> {"version", "value", "finished_at"}
+        self._errors = {}              # key -> {"version", "message", "failed_at"}
+        self._running = {}             # key -> version
+        self._queued = {}              # key -> (version, job)
+        self.runs = 0
+        self.joined = 0
+        self.failures = 0
+
+    def request(self, key, version, job):
+        """
+        Return (result, current, error) for a job key: the last good result as a dict with
+        "value", "version" and "finished_at" (or None), whether it is for this version, and the error of a failed run for this
+        version. Starts the job unless a current result, a recent failure or an identical
+        run already covers it.
+        """
+        with self._lock:
+            result, current, error = self._lookup(key, version)
+            if not current and not error:
+                self._start(key, version, job)
+            return result, current, error
+
+    def peek(self, key, version):
+        """
+        Like request(), but never starts a job.
+        """
+        with self._lock:
+            return self._lookup(key, version)
+
+    def discard(self, key):
+        """
+        Drop the stored result and error of a key, e.g. once its value has been used.
+        """
+        with self._lock:
+            self._results.pop(key, None)
+            self._errors.pop(key, None)
+
+    def _lookup(self, key, version):
+        # Called with the lock held
+        now = time.monotonic()
+        result = self._results.get(key)
+        if result:
+            self._results.move_to_end(key)
+        current = bool(result) and result["version"] == version and now - result["finished_at"] < self.max_age_seconds
+        failed = self._errors.get(key)
+        error = failed["message"] if failed and failed["version"] == version and now - failed["failed_at"] < self.max_age_seconds else None
+        return result, current, error
+
+    def error(self, key):
+        """
+        The error of the last run for this key if it failed, whatever its version.
+        """
+        with self._lock:
+            failed = self._errors.get(key)
+            return failed["message"] if failed else None
+
+    def running(self, key):
+        """
+        Whether a job for this key is running or queued.
+        """
+        with self._lock:
+            return key in self._running or key in self._queued
+
+    def _start(self, key, version, job):
+        # Called with the lock held
+        if key not in self._running:
+            self._running[key] = version
+            self.runs += 1
+            self._executor.submit(self._run, key, version, job)
+        elif self._running[key] == version or self._queued.get(key, (None,))[0] == version:
+            self.joined += 1
+        else:
+            self._queued[key] = (version, job)
+
+    def _run(self, key, version, job):
+        try:
+            value = job()
+        except Exception as e:
+            with self._lock:
+                self._errors[key] = {"version": version, "message": f"{e.__class__.__name__}: {e}", "failed_at": time.monotonic()}
+                self.failures += 1
+        else:
+            with self._lock:
+                self._results[key] = {"version": version, "value": value, "finished_at": time.monotonic()}
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_results:
+                    self._results.popitem(last=False)
+                self._errors.pop(key, None)
+        finally:
+            with self._lock:
+                del self._running[key]
+                queued = self._queued.pop(key, None)
+                if queued:
+                    self._start(key, *queued)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "running": len(self._running),
+                "queued": len(self._queued),
+                "results": len(self._results),
+                "runs": self.runs,
+                "joined": self.joined,
+                "failures": self.failures,
+            }
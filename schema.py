@@ -0,0 +1,33 @@
+"""
+Field values and derived fields shared by the admin forms, the admin search and bulk import.
+"""
+import re
+
+PAYMENT_METHODS = ["Credit Card", "Debit Card", "PayPal", "Cash"]
+PAYMENT_STATUSES = ["Paid", "Pending"]
+
+# A vehicle with several suppliers is shown with, and credited to, the one with the lowest
+# value of this field: its first supplier
+FIRST_SUPPLIER_FIELD = "supplier_id"
+
+# Fields matched by the admin search, per collection. Their lowercased values and words are
+# stored in a search_keys array so a case-insensitive prefix search is an indexed range scan.
+SEARCH_FIELDS = {
+    "Customers": ["name", "email", "phone"],
+    "Vehicles": ["vehicle_id", "vehicle_name", "brand"],
+    "Suppliers": ["supplier_name", "email", "contact_info"],
+}
+
+
+def search_keys(collection_name, document):
+    """
+    Lowercased search terms of a document: each searchable value whole and split into words.
+    """
+    keys = set()
+    for field in SEARCH_FIELDS[collection_name]:
+        value = document.get(field)
+        value = "" if value is None else str(value).strip().lower()
+        if value:
+            keys.add(value)
+            keys.update(word for word in re.split(r"[\W_]+", value) if word)
+    return sorted(keys)
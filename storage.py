@@ -0,0 +1,464 @@
+"""
+Storage backends behind one repository interface.
+
+Repository covers the single-record operations the app performs on users, customers,
+vehicles, rentals, suppliers and payments, keyed by each entity's business key, plus the
+two joins behind the customer dashboard and the pending payments report (as rows or as an
+Arrow table). Two implementations:
+
+    MongoRepository(MongoClient(uri)[name])   the app's MongoDB database, joins as aggregations
+    SQLiteRepository(":memory:")              embedded sqlite3 engine, a file path or in memory
+
+SQLiteRepository keeps each record as a JSON document in a table per collection, with
+expression indexes on the fields that are filtered or joined on, and runs the joins as
+SQL. Filters are equality matches on top-level fields; documents must hold JSON values.
+
+The app itself always uses MongoRepository: for login, registration, the customer dashboard,
+the pending payments report and the admin forms that add, look up, change or delete one
+record. Its paginated tables, batch actions, rollups, text search and booking lease use
+MongoDB directly, so the app cannot run on SQLite. SQLiteRepository needs no server: it serves
+the conformance checks and scripts that only need the operations above.
+
+benchmarks/check_storage.py runs the same conformance checks against both.
+"""
+import itertools
+import json
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+import pyarrow as pa
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError as MongoDuplicateKeyError
+
+import schema
+
+try:
+    # Optional dependency: decodes BSON batches straight into Arrow buffers
+    from pymongoarrow.api import Schema as ArrowSchema, aggregate_arrow_all
+except ImportError:
+    aggregate_arrow_all = None
+
+# Collection and unique key of every entity
+ENTITIES = {
+    "users": ("Users", "username"),
+    "customers": ("Customers", "customer_id"),
+    "vehicles": ("Vehicles", "vehicle_id"),
+    "rentals": ("Rentals", "rental_id"),
+    "suppliers": ("Suppliers", "supplier_id"),
+    "payments": ("Payments", "payment_id"),
+}
+
+# Secondary indexes of the embedded engine, matching the app's MongoDB indexes.
+# A tuple of fields declares a compound index.
+SQLITE_INDEXES = {
+    "customers": ["email"],
+    "rentals": [("customer_id", "start_date"), "vehicle_id", "start_date"],
+    "suppliers": ["vehicle_id"],
+    "payments": ["rental_id", "customer_id", "payment_date", ("status", "payment_date", "payment_id")],
+}
+
+PENDING_PAYMENTS_COLUMNS = ["Payment ID", "Customer Name", "Customer Email", "Vehicle Name",
+                            "Amount", "Payment Date", "Payment Status"]
+PENDING_PAYMENTS_SCHEMA = {
+    "Payment ID": pa.string(),
+    "Customer Name": pa.string(),
+    "Customer Email": pa.string(),
+    "Vehicle Name": pa.string(),
+    "Amount": pa.float64(),
+    "Payment Date": pa.string(),
+    "Payment Status": pa.string(),
+}
+
+ARROW_BATCH_SIZE = 10000
+
+
+class DuplicateKeyError(Exception):
+    """
+    Raised when an insert or update would give two records of an entity the same key.
+    """
+
+
+def pending_payments_pipeline(match=None, newest_first=True, limit=None):
+    """
+    Pending payments joined with their customer, rental and vehicle, one row per payment.
+    Payments of the same date are ordered by payment_id, in the same direction.
+    """
+    direction = DESCENDING if newest_first else ASCENDING
+    pipeline = [
+        {"$match": {**(match or {}), "status": "Pending"}},
+        {"$sort": {"payment_date": direction, "payment_id": direction}},
+        {"$lookup": {"from": "Customers", "localField": "customer_id",
+                     "foreignField": "customer_id", "as": "customer"}},
+        {"$unwind": "$customer"},
+        {"$lookup": {"from": "Rentals", "localField": "rental_id",
+                     "foreignField": "rental_id", "as": "rental"}},
+        {"$unwind": "$rental"},
+        {"$lookup": {"from": "Vehicles", "localField": "rental.vehicle_id",
+                     "foreignField": "vehicle_id", "as": "vehicle"}},
+        {"$unwind": "$vehicle"},
+    ]
+    # Limit after the joins, so payments whose customer, rental or vehicle is gone do not
+    # take the place of those shown; the pipeline streams, so it still stops after `limit` rows
+    if limit:
+        pipeline.append({"$limit": limit})
+    return pipeline + [
+        {"$project": {
+            "_id": 0,
+            "Payment ID": "$payment_id",
+            "Customer Name": "$customer.name",
+            "Customer Email": "$customer.email",
+            "Vehicle Name": "$vehicle.vehicle_name",
+            "Amount": "$amount",
+            "Payment Date": "$payment_date",
+            "Payment Status": "$status",
+        }},
+    ]
+
+
+def aggregate_arrow(collection, pipeline, schema):
+    """
+    Run an aggregation into a pyarrow Table with the given {column: Arrow type} schema.
+    With PyMongoArrow installed no Python object is created per document; otherwise the
+    cursor is converted one batch at a time, so at most one batch exists as dicts.
+    """
+    if aggregate_arrow_all:
+        return aggregate_arrow_all(collection, pipeline, schema=ArrowSchema(schema))
+    arrow_schema = pa.schema(list(schema.items()))
+    cursor = collection.aggregate(pipeline, batchSize=ARROW_BATCH_SIZE)
+    batches = [pa.RecordBatch.from_pylist(documents, schema=arrow_schema)
+               for documents in iter(lambda: list(itertools.islice(cursor, ARROW_BATCH_SIZE)), [])]
+    return pa.Table.from_batches(batches, schema=arrow_schema)
+
+
+class Repository(ABC):
+    """
+    The storage operations the app uses. `entity` is a key of ENTITIES, `key` the value of
+    its unique key field, and documents are returned without MongoDB's _id.
+    """
+    @abstractmethod
+    def insert(self, entity, document):
+        """
+        Insert a record, raising DuplicateKeyError if its key is taken.
+        """
+
+    @abstractmethod
+    def insert_many(self, entity, documents):
+        """
+        Insert records, skipping those whose key is taken. Returns the number inserted.
+        """
+
+    @abstractmethod
+    def get(self, entity, key):
+        ...
+
+    @abstractmethod
+    def find(self, entity, filters=None, sort=None, skip=0, limit=None):
+        """
+        Records whose fields equal `filters`, ordered by `sort`, a list of
+        (field, ASCENDING or DESCENDING) pairs.
+        """
+
+    @abstractmethod
+    def count(self, entity, filters=None):
+        ...
+
+    @abstractmethod
+    def update(self, entity, key, changes):
+        """
+        Set the given fields of a record. Returns whether the record exists.
+        """
+
+    @abstractmethod
+    def delete(self, entity, key):
+        """
+        Delete a record and return it, or None if it does not exist.
+        """
+
+    @abstractmethod
+    def customer_details(self, email, page=1, page_size=10):
+        """
+        A customer with one page of their rentals, latest start_date first (rentals without
+        one last), and their number of rentals. Each rental carries its payments and, when
+        they exist, its vehicle and the vehicle's first supplier (see schema.FIRST_SUPPLIER_FIELD).
+        Returns (None, [], 0) for an unknown email.
+        """
+
+    @abstractmethod
+    def pending_payments(self, limit=None, newest_first=True):
+        """
+        Pending payments with their customer and vehicle, as dicts keyed by
+        PENDING_PAYMENTS_COLUMNS. Payments whose customer, rental or vehicle is missing
+        are left out, and do not count towards the limit.
+        """
+
+    def pending_payments_table(self, limit=None, newest_first=True):
+        """
+        pending_payments() as a pyarrow Table with PENDING_PAYMENTS_SCHEMA.
+        """
+        rows = self.pending_payments(limit=limit, newest_first=newest_first)
+        return pa.Table.from_pylist(rows, schema=pa.schema(list(PENDING_PAYMENTS_SCHEMA.items())))
+
+
+def _without_ids(value):
+    if isinstance(value, dict):
+        return {field: _without_ids(item) for field, item in value.items() if field != "_id"}
+    if isinstance(value, list):
+        return [_without_ids(item) for item in value]
+    return value
+
+
+class MongoRepository(Repository):
+    def __init__(self, db):
+        self.db = db
+
+    def _collection(self, entity):
+        collection_name, key_field = ENTITIES[entity]
+        return self.db[collection_name], key_field
+
+    def insert(self, entity, document):
+        collection, _ = self._collection(entity)
+        try:
+            # insert_one adds _id to the document it is given
+            collection.insert_one(dict(document))
+        except MongoDuplicateKeyError as e:
+            raise DuplicateKeyError(str(e)) from e
+
+    def insert_many(self, entity, documents):
+        collection, _ = self._collection(entity)
+        documents = [dict(document) for document in documents]
+        if not documents:
+            return 0
+        try:
+            return len(collection.insert_many(documents, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            return e.details["nInserted"]
+
+    def get(self, entity, key):
+        collection, key_field = self._collection(entity)
+        return collection.find_one({key_field: key}, {"_id": 0})
+
+    def find(self, entity, filters=None, sort=None, skip=0, limit=None):
+        collection, _ = self._collection(entity)
+        cursor = collection.find(filters or {}, {"_id": 0})
+        if sort:
+            cursor = cursor.sort(sort)
+        return list(cursor.skip(skip).limit(limit or 0))
+
+    def count(self, entity, filters=None):
+        collection, _ = self._collection(entity)
+        return collection.count_documents(filters or {})
+
+    def update(self, entity, key, changes):
+        collection, key_field = self._collection(entity)
+        try:
+            return collection.update_one({key_field: key}, {"$set": changes}).matched_count > 0
+        except MongoDuplicateKeyError as e:
+            raise DuplicateKeyError(str(e)) from e
+
+    def delete(self, entity, key):
+        collection, key_field = self._collection(entity)
+        return collection.find_one_and_delete({key_field: key}, {"_id": 0})
+
+    def customer_details(self, email, page=1, page_size=10):
+        pipeline = [
+            {"$match": {"email": email}},
+            {"$limit": 1},
+            {"$lookup": {
+                "from": "Rentals",
+                "let": {"customer_id": "$customer_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$customer_id", "$$customer_id"]}}},
+                    {"$sort": {"start_date": DESCENDING, "_id": DESCENDING}},
+                    {"$skip": (page - 1) * page_size},
+                    {"$limit": page_size},
+                    {"$lookup": {"from": "Payments", "localField": "rental_id",
+                                 "foreignField": "rental_id", "as": "payments"}},
+                    {"$lookup": {"from": "Vehicles", "localField": "vehicle_id",
+                                 "foreignField": "vehicle_id", "as": "vehicle"}},
+                    {"$unwind": {"path": "$vehicle", "preserveNullAndEmptyArrays": True}},
+                    # The vehicle's first supplier only, so a rental appears once however many it has
+                    {"$lookup": {"from": "Suppliers", "localField": "vehicle_id", "foreignField": "vehicle_id",
+                                 "pipeline": [{"$sort": {schema.FIRST_SUPPLIER_FIELD: ASCENDING}}, {"$limit": 1}],
+                                 "as": "supplier"}},
+                    {"$unwind": {"path": "$supplier", "preserveNullAndEmptyArrays": True}},
+                ],
+                "as": "rentals",
+            }},
+            {"$lookup": {
+                "from": "Rentals",
+                "let": {"customer_id": "$customer_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$customer_id", "$$customer_id"]}}},
+                    {"$count": "total"},
+                ],
+                "as": "rental_count",
+            }},
+        ]
+        customer = next(self.db["Customers"].aggregate(pipeline), None)
+        if not customer:
+            return None, [], 0
+
+        customer = _without_ids(customer)
+        customer_rentals = customer.pop("rentals")
+        rental_count = customer.pop("rental_count")
+        return customer, customer_rentals, rental_count[0]["total"] if rental_count else 0
+
+    def pending_payments(self, limit=None, newest_first=True):
+        return list(self.db["Payments"].aggregate(pending_payments_pipeline(newest_first=newest_first, limit=limit)))
+
+    def pending_payments_table(self, limit=None, newest_first=True):
+        # Straight from the cursor into Arrow, with no list of dicts in between
+        return aggregate_arrow(self.db["Payments"], pending_payments_pipeline(newest_first=newest_first, limit=limit),
+                               PENDING_PAYMENTS_SCHEMA)
+
+
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _field(field, table=None):
+    """
+    SQL expression for a top-level document field. Field names are checked, since they
+    are interpolated into the statement.
+    """
+    if not FIELD_NAME.match(field):
+        raise ValueError(f"Unsupported field name '{field}'")
+    return f"json_extract({table + '.' if table else ''}doc, '$.{field}')"
+
+
+class SQLiteRepository(Repository):
+    def __init__(self, path=":memory:"):
+        # One connection shared by the app's threads, with statements serialised by a lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            for entity, (table, _) in ENTITIES.items():
+                self._connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (key PRIMARY KEY, doc TEXT NOT NULL)')
+                for fields in SQLITE_INDEXES.get(entity, []):
+                    fields = (fields,) if isinstance(fields, str) else fields
+                    self._connection.execute(
+                        f'CREATE INDEX IF NOT EXISTS "{table}_{"_".join(fields)}" '
+                        f'ON "{table}" ({", ".join(_field(field) for field in fields)})'
+                    )
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def _where(self, filters):
+        filters = filters or {}
+        if not filters:
+            return "", []
+        return " WHERE " + " AND ".join(f"{_field(field)} = ?" for field in filters), list(filters.values())
+
+    def insert(self, entity, document):
+        table, key_field = ENTITIES[entity]
+        try:
+            with self._lock, self._connection:
+                self._connection.execute(f'INSERT INTO "{table}" (key, doc) VALUES (?, ?)',
+                                         (document[key_field], json.dumps(document)))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(str(e)) from e
+
+    def insert_many(self, entity, documents):
+        table, key_field = ENTITIES[entity]
+        with self._lock, self._connection:
+            before = self._connection.total_changes
+            self._connection.executemany(f'INSERT OR IGNORE INTO "{table}" (key, doc) VALUES (?, ?)',
+                                         ((document[key_field], json.dumps(document)) for document in documents))
+            return self._connection.total_changes - before
+
+    def get(self, entity, key):
+        table, _ = ENTITIES[entity]
+        rows = self._query(f'SELECT doc FROM "{table}" WHERE key = ?', (key,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def find(self, entity, filters=None, sort=None, skip=0, limit=None):
+        table, _ = ENTITIES[entity]
+        where, parameters = self._where(filters)
+        order = " ORDER BY " + ", ".join(
+            f"{_field(field)} {'DESC' if direction == DESCENDING else 'ASC'}" for field, direction in sort
+        ) if sort else " ORDER BY rowid"
+        rows = self._query(f'SELECT doc FROM "{table}"{where}{order} LIMIT ? OFFSET ?',
+                           parameters + [limit or -1, skip])
+        return [json.loads(doc) for doc, in rows]
+
+    def count(self, entity, filters=None):
+        table, _ = ENTITIES[entity]
+        where, parameters = self._where(filters)
+        return self._query(f'SELECT count(*) FROM "{table}"{where}', parameters)[0][0]
+
+    def update(self, entity, key, changes):
+        table, key_field = ENTITIES[entity]
+        try:
+            with self._lock, self._connection:
+                row = self._connection.execute(f'SELECT doc FROM "{table}" WHERE key = ?', (key,)).fetchone()
+                if not row:
+                    return False
+                document = {**json.loads(row[0]), **changes}
+                self._connection.execute(f'UPDATE "{table}" SET key = ?, doc = ? WHERE key = ?',
+                                         (document[key_field], json.dumps(document), key))
+                return True
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(str(e)) from e
+
+    def delete(self, entity, key):
+        table, _ = ENTITIES[entity]
+        with self._lock, self._connection:
+            row = self._connection.execute(f'DELETE FROM "{table}" WHERE key = ? RETURNING doc', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def customer_details(self, email, page=1, page_size=10):
+        rows = self._query(f'SELECT doc FROM "Customers" WHERE {_field("email")} = ? ORDER BY rowid LIMIT 1', (email,))
+        if not rows:
+            return None, [], 0
+        customer = json.loads(rows[0][0])
+
+        total = self._query(f'SELECT count(*) FROM "Rentals" WHERE {_field("customer_id")} = ?',
+                            (customer["customer_id"],))[0][0]
+        # The page of rentals, each with its payments gathered by a correlated subquery and
+        # its vehicle and first supplier joined by key
+        rows = self._query(f'''
+            SELECT r.doc,
+                   (SELECT json_group_array(json(p.doc)) FROM
+                       (SELECT doc FROM "Payments" WHERE {_field("rental_id")} = {_field("rental_id", "r")} ORDER BY rowid) AS p),
+                   v.doc, s.doc
+            FROM (SELECT rowid AS id, {_field("start_date")} AS start_date, doc FROM "Rentals"
+                  WHERE {_field("customer_id")} = ?
+                  ORDER BY start_date DESC, rowid DESC LIMIT ? OFFSET ?) AS r
+            LEFT JOIN "Vehicles" AS v ON v.key = {_field("vehicle_id", "r")}
+            LEFT JOIN "Suppliers" AS s ON s.rowid = (
+                SELECT rowid FROM "Suppliers" WHERE {_field("vehicle_id")} = {_field("vehicle_id", "r")}
+                ORDER BY {_field(schema.FIRST_SUPPLIER_FIELD)} LIMIT 1)
+            ORDER BY r.start_date DESC, r.id DESC
+        ''', (customer["customer_id"], page_size, (page - 1) * page_size))
+
+        customer_rentals = []
+        for rental_doc, payments_doc, vehicle_doc, supplier_doc in rows:
+            rental = json.loads(rental_doc)
+            rental["payments"] = json.loads(payments_doc)
+            if vehicle_doc is not None:
+                rental["vehicle"] = json.loads(vehicle_doc)
+            if supplier_doc is not None:
+                rental["supplier"] = json.loads(supplier_doc)
+            customer_rentals.append(rental)
+        return customer, customer_rentals, total
+
+    def pending_payments(self, limit=None, newest_first=True):
+        direction = "DESC" if newest_first else "ASC"
+        rows = self._query(f'''
+            SELECT {_field("payment_id", "p")}, {_field("name", "c")}, {_field("email", "c")},
+                   {_field("vehicle_name", "v")}, {_field("amount", "p")}, {_field("payment_date", "p")},
+                   {_field("status", "p")}
+            FROM "Payments" AS p
+            JOIN "Customers" AS c ON c.key = {_field("customer_id", "p")}
+            JOIN "Rentals" AS r ON r.key = {_field("rental_id", "p")}
+            JOIN "Vehicles" AS v ON v.key = {_field("vehicle_id", "r")}
+            WHERE {_field("status", "p")} = 'Pending'
+            ORDER BY {_field("payment_date", "p")} {direction}, {_field("payment_id", "p")} {direction}
+            LIMIT ?
+        ''', (limit or -1,))
+        # Like $project, leave out fields the joined documents do not have
+        return [{column: value for column, value in zip(PENDING_PAYMENTS_COLUMNS, row) if value is not None}
+                for row in rows]